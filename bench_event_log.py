@@ -0,0 +1,106 @@
+import random
+
+import profiler
+from bench_tensor import timeit
+from delta_store import DeltaStore
+from event_log import SNAPSHOT_EVERY
+from fake_sheets import FakeClient
+from rules import DEFAULT_RULES
+from scoring import day_scores
+from sheets import SheetPool
+from standings import ensure_standings, update_standings
+from storage import SheetsBackend
+from synthetic import generate
+from timeline import ensure_timeline, update_timeline
+
+# --- BENCHMARK: REGISTRO EVENTI SU UN FOGLIO FINTO ---
+# Per campionati di lunghezza diversa: byte scritti per una modifica a una gara (costanti, non
+# crescono con lo storico), byte delle compattazioni ogni SNAPSHOT_EVERY eventi, e costo del
+# caricamento con la coda di eventi più lunga possibile. Alla fine si rilegge tutto e si confronta.
+# Come nell'app, ogni modifica aggiorna la classifica: con le celle riscritte sul posto
+# (DeltaStore) finisce in Meta!A1 a ogni salvataggio, nel registro no. Lo storico non si scrive
+# in nessuno dei due (vedi delta_store.meta_json). Ultima misura, 99 modifiche: evento ~125 byte,
+# istantanea ~1,1 KB, modifica sul posto 364-380 byte da 100 a 5000 giornate.
+# Uso: python bench_event_log.py [numero_modifiche]
+SIZES = [100, 1000, 5000]
+
+
+def new_backend(client, store=SheetsBackend):
+    return store(SheetPool({}, "fake://", client_factory=lambda: client,
+                           read_quota=10 ** 9, write_quota=10 ** 9))
+
+
+def run(n_days, n_edits, store=SheetsBackend, seed=3):
+    client = FakeClient()
+    backend = new_backend(client, store)
+    data = generate(n_days, seed=seed)
+    ensure_standings(data)
+    ensure_timeline(data)
+    backend.load()
+    backend.save(data)
+    rng = random.Random(seed)
+    days = list(data["giornate"])
+    event_bytes, snapshot_bytes = [], []
+    for _ in range(n_edits):
+        day_key, race = rng.choice(days), f"Gara {rng.randint(1, 12)}"
+        day = data["giornate"][day_key]
+        old_scores = day_scores(day, DEFAULT_RULES)
+        day["races"][race].append(day["races"][race].pop(0))
+        new_scores = day_scores(day, DEFAULT_RULES)
+        update_standings(data, old_scores, new_scores)
+        update_timeline(data, day_key, old_scores, new_scores)
+        snapshots = backend.stats.get("snapshots", 0)
+        profiler.start("modifica")
+        backend.write(backend.changes(data, [(day_key, race)]))
+        written = profiler.stop()["counters"].get("Byte scritti", 0)
+        (snapshot_bytes if backend.stats.get("snapshots", 0) > snapshots else event_bytes).append(written)
+
+    reader = new_backend(client, store)
+    assert reader.load()["giornate"] == data["giornate"], "dati riletti diversi"
+    return {"giornate": n_days, "evento": sum(event_bytes) // len(event_bytes),
+            "istantanea": max(snapshot_bytes, default=0), "coda": reader.stats.get("tail_events", 0),
+            "load_ms": timeit(lambda: new_backend(client, store).load(), repeat=3)}
+
+
+# Un load() che legge il foglio mentre la coda scrive un evento non deve riportare indietro la
+# versione: l'evento successivo riuserebbe lo stesso numero e sovrascriverebbe quello appena scritto
+def check_load_during_write(n_days=20, seed=5):
+    client = FakeClient()
+    backend = new_backend(client)
+    data = generate(n_days, seed=seed)
+    backend.load()
+    backend.save(data)
+    read = backend.pool.call_spreadsheet
+
+    def edit(race):
+        placings = data["giornate"]["Giornata 1"]["races"][race]
+        placings.append(placings.pop(0))
+        backend.write(backend.changes(data, [("Giornata 1", race)]))
+
+    def read_then_write(fn, **kwargs):
+        result = read(fn, **kwargs)
+        backend.pool.call_spreadsheet = read
+        edit("Gara 1")  # il thread della coda finisce di scrivere prima che load() aggiorni lo stato
+        return result
+
+    backend.pool.call_spreadsheet = read_then_write
+    backend.load()
+    edit("Gara 2")
+    reader = new_backend(client)
+    assert reader.load()["giornate"] == data["giornate"], "load() durante una scrittura: modifica persa"
+    assert reader.version() == 3, "load() durante una scrittura: numero di evento riusato"
+
+
+if __name__ == "__main__":
+    import sys
+
+    n_edits = int(sys.argv[1]) if len(sys.argv) > 1 else SNAPSHOT_EVERY * 2 - 1
+    check_load_during_write()
+    print(f"Modifiche a una gara: {n_edits} (istantanea ogni {SNAPSHOT_EVERY} eventi)")
+    print(f"{'Giornate':>8} | {'Byte/evento':>11} | {'Byte/istantanea':>15} | {'Eventi in coda':>14} | "
+          f"{'Caricamento':>11} | Byte/modifica sul posto")
+    for n_days in SIZES:
+        r = run(n_days, n_edits)
+        before = run(n_days, n_edits, store=DeltaStore)
+        print(f"{r['giornate']:>8} | {r['evento']:>11} | {r['istantanea']:>15} | {r['coda']:>14} | "
+              f"{r['load_ms']:>8.1f} ms | {before['evento']}")
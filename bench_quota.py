@@ -0,0 +1,127 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from fake_sheets import FakeClient
+from offline import OfflineStore
+from sheets import SheetPool
+from storage import SheetsBackend
+from synthetic import generate
+from write_behind import WriteBehindQueue
+
+# --- SERATA AFFOLLATA SU UN FOGLIO FINTO: QUOTE, TENTATIVI, SCRITTURE PERSE ---
+# L'admin salva una gara dopo l'altra mentre alcuni spettatori in diretta leggono la versione.
+# Il foglio finto (fake_sheets.py) risponde 429 oltre la quota, 503 a caso e a volte perde la
+# risposta dopo aver già scritto. Si confronta il pool senza limitatore (quota infinita lato
+# client) con quello normale, poi si rilegge il foglio e si contano le modifiche che mancano.
+# Per non aspettare minuti veri il "minuto" dura SCALED_MINUTE secondi (attese scalate di conseguenza).
+# Uso: python bench_quota.py [numero_modifiche] [spettatori]
+SCALED_MINUTE = 3.0
+QUOTA = 60
+
+
+def run(limited, n_edits, n_viewers, seed=7):
+    client = FakeClient(latency=0.01, quota_per_minute=QUOTA, error_rate=0.05, lost_response_rate=0.03,
+                        window=SCALED_MINUTE, seed=seed)
+    quota = QUOTA if limited else 10 ** 9
+    pool = SheetPool({}, "fake://", client_factory=lambda: client,
+                     read_quota=quota, write_quota=quota, window=SCALED_MINUTE)
+    pool.backoff_base = SCALED_MINUTE / 60
+    pool.backoff_max = SCALED_MINUTE / 2
+    backend = SheetsBackend(pool)
+
+    rng = random.Random(seed)
+    data = generate(20, seed=seed)
+    backend.load()
+    backend.save(data)
+    days = list(data["giornate"])
+    failures = {"save": 0, "read": 0}
+    done = threading.Event()
+
+    def viewer():
+        while not done.is_set():
+            try:
+                backend.version()
+            except Exception:
+                failures["read"] += 1
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=viewer, daemon=True) for _ in range(n_viewers)]
+    for t in threads:
+        t.start()
+    start = time.perf_counter()
+    for _ in range(n_edits):
+        day_key, race = rng.choice(days), f"Gara {rng.randint(1, 12)}"
+        rng.shuffle(data["giornate"][day_key]["races"][race])
+        try:
+            backend.update(data, [(day_key, race)])
+        except Exception:
+            failures["save"] += 1
+    elapsed = time.perf_counter() - start
+    done.set()
+    for t in threads:
+        t.join()
+
+    # Rilettura da un pool nuovo, senza errori né quota: cosa è rimasto davvero sul foglio
+    client.error_rate = client.lost_response_rate = 0.0
+    client.quota_per_minute = None
+    stored = SheetsBackend(SheetPool({}, "fake://", client_factory=lambda: client)).load()
+    lost = sum(1 for day_key in days
+               for race, placings in data["giornate"][day_key]["races"].items()
+               if stored["giornate"][day_key]["races"][race] != placings)
+    return {
+        "secondi": round(elapsed, 2),
+        "salvataggi_falliti": failures["save"],
+        "letture_fallite": failures["read"],
+        "gare_diverse_sul_foglio": lost,
+        "risposte_429": client.stats["rejected_429"],
+        "errori_503": client.stats["errors_503"],
+        "risposte_perse": client.stats["lost_responses"],
+        "picco_letture": client.stats["peak_read"],
+        "picco_scritture": client.stats["peak_write"],
+        "tentativi": pool.stats["retries"],
+        "attese_quota": pool.stats["throttled"],
+    }
+
+
+# Come save_data in torneo_cloud.py: una modifica ancora in coda (non scritta) deve restare nel
+# diario anche se dopo arriva un salvataggio che non cambia nulla
+def check_noop_save_keeps_journal():
+    client = FakeClient()
+    backend = SheetsBackend(SheetPool({}, "fake://", client_factory=lambda: client,
+                                      read_quota=10 ** 9, write_quota=10 ** 9))
+    data = generate(5, seed=1)
+    backend.load()
+    backend.save(data)
+    with tempfile.TemporaryDirectory() as tmp:
+        offline = OfflineStore(os.path.join(tmp, "snapshot.json"), os.path.join(tmp, "journal.jsonl"))
+        queue = WriteBehindQueue(backend, window=3600, on_saved=offline.confirm)
+        placings = data["giornate"]["Giornata 1"]["races"]["Gara 1"]
+        placings.append(placings.pop(0))
+        dirty = [("Giornata 1", "Gara 1")]
+        assert queue.submit(data, dirty, offline.record(data, dirty))
+        seq = offline.record(data, dirty)
+        assert not queue.submit(data, dirty, seq), "salvataggio senza modifiche accodato"
+        offline.confirm_one(seq)
+        assert [e["seq"] for e in offline.pending()] == [1], "modifica in coda tolta dal diario"
+        queue.flush()
+        assert offline.pending() == [], "diario non confermato dopo la scrittura"
+
+
+if __name__ == "__main__":
+    import sys
+
+    n_edits = int(sys.argv[1]) if len(sys.argv) > 1 else 80
+    n_viewers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    check_noop_save_keeps_journal()
+    print(f"{n_edits} salvataggi, {n_viewers} spettatori, quota {QUOTA} richieste ogni {SCALED_MINUTE} s")
+    results = {"senza limitatore": run(False, n_edits, n_viewers), "con limitatore": run(True, n_edits, n_viewers)}
+    print(json.dumps(results, indent=2))
+
+    if results["con limitatore"]["gare_diverse_sul_foglio"] or results["con limitatore"]["salvataggi_falliti"]:
+        print("❌ Con il limitatore sono andate perse delle modifiche")
+        sys.exit(1)
+    print("✅ Nessuna modifica persa con il limitatore")
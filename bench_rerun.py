@@ -0,0 +1,77 @@
+import functools
+import json
+import os
+import tempfile
+
+from synthetic import generate
+
+# --- BENCHMARK: MODIFICA DI UNA GARA, RERUN COMPLETO vs FRAMMENTO GARE ---
+# Uso: python bench_rerun.py [numero_giornate] [numero_modifiche]
+# Prima dei frammenti ogni radio in GARE rieseguiva tutto lo script ("Rerun completo");
+# ora riesegue solo la scheda GARE ("Frammento GARE"). Si misurano entrambi davvero, alternando
+# le modifiche: AppTest riesegue sempre tutto lo script, quindi per il frammento si chiede a
+# Streamlit un rerun del solo frammento GARE, come fa il browser quando cambia un suo widget.
+# I tempi sono quelli della profilazione dell'app (vedi profiler.py) su un backend locale, quindi
+# senza latenza di rete; entrambi comprendono il salvataggio della modifica.
+OPTIONS = ["1° Posto", "2° Posto", "3° Posto", "4° Posto"]
+
+
+# Id del frammento che esegue la funzione name (es. tab_gare) tra quelli registrati finora
+def fragment_id(at, name):
+    for fragment_id, fragment in at._fragment_storage._fragments.items():
+        cells = fragment.__closure__ or ()
+        if any(getattr(c.cell_contents, "__name__", None) == name for c in cells):
+            return fragment_id
+    raise LookupError(f"frammento {name} non trovato")
+
+
+def run_fragment(at, name):
+    from streamlit.testing.v1 import local_script_runner
+
+    rerun_data = local_script_runner.RerunData
+    local_script_runner.RerunData = functools.partial(rerun_data, fragment_id_queue=[fragment_id(at, name)])
+    try:
+        at.run()
+    finally:
+        local_script_runner.RerunData = rerun_data
+
+
+def run(n_days, n_edits):
+    from streamlit.testing.v1 import AppTest
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.json")
+    with open(path, "w") as f:
+        json.dump(generate(n_days), f)
+    os.environ["TORNEO_STORAGE_BACKEND"] = "local"
+    os.environ["TORNEO_STORAGE_PATH"] = path
+
+    at = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "torneo_cloud.py"),
+                           default_timeout=120)
+    at.session_state["is_admin"] = True
+    at.session_state["profiling"] = True
+    at.run()
+    times = {"Rerun completo": [], "Frammento GARE": []}
+    for k in range(n_edits * 2):
+        radio = next(r for r in at.radio if not r.disabled)
+        # Sempre un valore diverso da quello attuale, così ogni rerun salva una modifica
+        radio.set_value(next(o for o in OPTIONS[k % len(OPTIONS):] + OPTIONS if o != radio.value))
+        if k % 2:
+            run_fragment(at, "tab_gare")
+        else:
+            at.run()
+        record = at.session_state["profile_log"][-1]
+        times[record["tipo"]].append(record["totale_ms"])
+    assert len(times["Frammento GARE"]) == n_edits, "il rerun del frammento ha rieseguito tutto lo script"
+    return {kind: sum(v) / len(v) for kind, v in times.items()}
+
+
+if __name__ == "__main__":
+    import sys
+
+    n_days = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    n_edits = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    results = run(n_days, n_edits)
+    full_ms, fragment_ms = results["Rerun completo"], results["Frammento GARE"]
+    print(f"Giornate: {n_days}, modifiche: {n_edits} per tipo di rerun")
+    print(f"Prima (rerun completo):   {full_ms:8.1f} ms")
+    print(f"Dopo (solo scheda GARE):  {fragment_ms:8.1f} ms  -> x{full_ms / fragment_ms:.1f}")
@@ -0,0 +1,81 @@
+import json
+import os
+import subprocess
+import sys
+
+# --- TEMPO DI AVVIO ---
+# Misura con `python -X importtime`, in un processo nuovo, quanto costano gli import in cima a
+# torneo_cloud.py oltre a streamlit: è ciò che ogni avvio a freddo (o risveglio su Streamlit Cloud)
+# paga prima di disegnare l'intestazione. Controlla anche che le dipendenze pesanti restino fuori
+# finché non servono. Esce con codice 1 se si supera il budget o se una di esse viene caricata.
+# Uso: python bench_startup.py [budget_ms]   (oppure variabile d'ambiente TORNEO_STARTUP_BUDGET_MS)
+STARTUP_BUDGET_MS = 150
+# Gli stessi moduli importati in cima a torneo_cloud.py
+APP_MODULES = ["sheets", "storage", "delta_store", "event_log", "write_behind", "offline", "profiler",
+               "figure_cache", "rules", "scoring", "migrations", "day_entry", "standings", "timeline"]
+# Da caricare solo nel codice che li usa (client Sheets, tabelle, grafici, tensore). Quelli che
+# streamlit importa già da sé non si contano: non dipendono dall'app.
+LAZY_MODULES = ["gspread", "oauth2client", "pandas", "plotly.express", "plotly.graph_objects", "numpy"]
+MARKER = "--- import app ---"
+
+CHILD = f"""
+import json, sys, time
+start = time.perf_counter()
+import streamlit
+streamlit_ms = (time.perf_counter() - start) * 1000
+before = set(sys.modules)
+sys.stderr.write({MARKER!r} + "\\n")
+start = time.perf_counter()
+{"".join(f"import {m}; " for m in APP_MODULES)}
+app_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"streamlit_ms": streamlit_ms, "app_ms": app_ms,
+                  "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules and m not in before]}}))
+"""
+
+
+# Righe di primo livello di -X importtime dopo il marcatore: [(modulo, ms cumulativi)]
+def parse_importtime(stderr):
+    modules = []
+    lines = stderr.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER) + 1:]
+    for line in lines:
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name[1:]
+        if not name.startswith(" "):
+            modules.append((name, int(cumulative) / 1000))
+    return modules
+
+
+def measure():
+    workdir = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD],
+                          cwd=workdir, capture_output=True, text=True, check=True)
+    report = json.loads(proc.stdout)
+    report["modules"] = sorted(parse_importtime(proc.stderr), key=lambda m: -m[1])
+    return report
+
+
+if __name__ == "__main__":
+    budget = float(sys.argv[1] if len(sys.argv) > 1 else
+                   os.environ.get("TORNEO_STARTUP_BUDGET_MS", STARTUP_BUDGET_MS))
+    report = measure()
+
+    print(f"streamlit:        {report['streamlit_ms']:8.1f} ms (fuori budget)")
+    print(f"moduli dell'app:  {report['app_ms']:8.1f} ms (budget {budget:.0f} ms)")
+    print("\nImport più lenti (con -X importtime):")
+    for name, ms in report["modules"][:10]:
+        print(f"  {name:30s} {ms:8.1f} ms")
+
+    failed = False
+    if report["loaded"]:
+        print(f"\n❌ Caricati all'avvio ma dovrebbero essere pigri: {', '.join(report['loaded'])}")
+        failed = True
+    if report["app_ms"] > budget:
+        print(f"\n❌ Avvio oltre il budget: {report['app_ms']:.1f} ms > {budget:.0f} ms")
+        failed = True
+    if not failed:
+        print("\n✅ Avvio nel budget")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,119 @@
+import json
+import os
+import platform
+import tempfile
+import time
+
+import scoring
+from bench_tensor import timeit
+from charts import build_scalata_figure, build_radar_figure
+from scoring import championship_scores, day_scores
+from sqlite_backend import SqliteBackend
+from standings import compute_standings
+from storage import LocalJsonBackend
+from synthetic import generate
+from tensor import ChampionshipTensor
+from timeline import compute_timeline, update_timeline
+
+# --- BENCHMARK COMPLETO SU CAMPIONATI SINTETICI ---
+# Misura caricamento, punteggi, classifica, storico e grafici a 10/100/1.000/10.000 giornate e salva
+# i risultati (ms, migliore di più ripetizioni) in JSON, per confrontarli con una misura precedente.
+# Uso: python bench_suite.py [risultati.json] [riferimento.json]
+SIZES = [10, 100, 1000, 10000]
+
+
+def _sorted_days(data):
+    return sorted(data["giornate"].keys(), key=lambda x: int(x.split(" ")[1]))
+
+
+def _cold_scores(data, days):
+    scoring._cache.clear()
+    return championship_scores(data, days)
+
+
+# Modifica l'ultima giornata (una gara) e aggiorna lo storico da lì in poi, come fa l'app
+def _edit_last_day(data, days):
+    day = data["giornate"][days[-1]]
+    old = day_scores(day)
+    day["races"]["Gara 1"] = day["races"]["Gara 1"][::-1]
+    update_timeline(data, days[-1], old, day_scores(day))
+
+
+def bench_size(n_days, workdir):
+    repeat = 3 if n_days <= 1000 else 1
+    data = generate(n_days)
+    days = _sorted_days(data)
+    players = data["config"]["players"]
+    results = {}
+
+    local = LocalJsonBackend(os.path.join(workdir, f"bench_{n_days}.json"))
+    results["save_local"] = timeit(lambda: local.save(data), repeat)
+    results["load_local"] = timeit(local.load, repeat)
+    results["payload_bytes"] = os.path.getsize(local.path)
+
+    db = SqliteBackend(os.path.join(workdir, f"bench_{n_days}.db"))
+    results["save_sqlite"] = timeit(lambda: db.save(data), 1)
+    results["load_sqlite"] = timeit(db.load, repeat)
+    results["standings_sqlite"] = timeit(lambda: db.standings(players), repeat)
+
+    results["scoring_cold"] = timeit(lambda: _cold_scores(data, days), repeat)
+    results["scoring_warm"] = timeit(lambda: championship_scores(data, days), repeat)
+    results["standings_full"] = timeit(lambda: compute_standings(data), repeat)
+    tensor = ChampionshipTensor.from_data(data)
+    results["standings_numpy"] = timeit(lambda: (tensor._memo.clear(), tensor.standings()), repeat)
+
+    results["timeline_full"] = timeit(lambda: compute_timeline(data), repeat)
+    data["timeline"] = compute_timeline(data)
+    results["timeline_edit_last"] = timeit(lambda: _edit_last_day(data, days), repeat)
+
+    results["figure_scalata"] = timeit(lambda: build_scalata_figure(data["timeline"], players), repeat)
+    results["figure_radar"] = timeit(lambda: build_radar_figure(data["timeline"], players[0]), repeat)
+    return {k: round(v, 3) for k, v in results.items()}
+
+
+def run(sizes=SIZES):
+    workdir = tempfile.mkdtemp()
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {},
+    }
+    for n_days in sizes:
+        print(f"Giornate: {n_days}...")
+        report["results"][str(n_days)] = bench_size(n_days, workdir)
+    return report
+
+
+# Rapporto nuovo/vecchio per ogni misura presente in entrambi (> 1 = più lento di prima)
+def compare(report, reference):
+    rows = []
+    for size, metrics in report["results"].items():
+        for name, value in metrics.items():
+            old = reference["results"].get(size, {}).get(name)
+            if old and name != "payload_bytes":
+                rows.append((int(size), name, old, value, value / old))
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    out_path = sys.argv[1] if len(sys.argv) > 1 else "bench_results.json"
+    report = run()
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for size, metrics in report["results"].items():
+        print(f"\n--- {size} giornate ---")
+        for name, value in metrics.items():
+            print(f"{name:20s} {value:12.2f}")
+    print(f"\n✅ Risultati salvati in {out_path}")
+
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "r") as f:
+            reference = json.load(f)
+        print(f"\n--- Confronto con {sys.argv[2]} ---")
+        for size, name, old, new, ratio in compare(report, reference):
+            flag = "⚠️" if ratio > 1.2 else "  "
+            print(f"{flag} {size:6d} {name:20s} {old:10.2f} -> {new:10.2f} ms  (x{ratio:.2f})")
@@ -0,0 +1,62 @@
+import time
+
+from rules import DEFAULT_RULES, PRESETS, compile_ruleset
+from scoring import compute_day
+from synthetic import generate
+from tensor import ChampionshipTensor
+
+# --- BENCHMARK: CICLI PYTHON vs NUMPY ---
+# Uso: python bench_tensor.py [numero_giornate]
+
+
+def python_loops(data, rules=DEFAULT_RULES):
+    days = sorted(data["giornate"].keys(), key=lambda x: int(x.split(" ")[1]))
+    totals, games = [0] * 4, [0] * 4
+    averages = []
+    for d in days:
+        for i, sc in enumerate(compute_day(data["giornate"][d], rules)):
+            if sc is not None:
+                totals[i] += sc["total"]
+                games[i] += 1
+        averages.append([totals[i] / games[i] if games[i] else 0 for i in range(4)])
+    return totals, averages
+
+
+def vectorized(tensor, rules=DEFAULT_RULES):
+    tensor._memo.clear()
+    totals, presences, media = tensor.standings(rules)
+    return totals, tensor.cumulative_average(rules), tensor.radar_percentages(rules)
+
+
+def timeit(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    import sys
+
+    n_days = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    data = generate(n_days)
+
+    tensor = ChampionshipTensor.from_data(data)
+    assert tensor.to_data() == data, "round-trip JSON non lossless"
+    loop_totals, _ = python_loops(data)
+    assert list(tensor.standings()[0]) == loop_totals, "totali diversi tra cicli e NumPy"
+    # Stessi piazzamenti, altro regolamento: si ricalcola tutto lo storico senza toccare i dati
+    alt_rules = compile_ruleset(PRESETS["Alternativa skill (12-8-4-0)"])
+    assert list(tensor.standings(alt_rules)[0]) == python_loops(data, alt_rules)[0], "regolamento alternativo"
+
+    t_build = timeit(lambda: ChampionshipTensor.from_data(data))
+    t_loops = timeit(lambda: python_loops(data))
+    t_vect = timeit(lambda: vectorized(tensor))
+    t_rules = timeit(lambda: vectorized(tensor, alt_rules))
+    print(f"Giornate: {n_days}")
+    print(f"Costruzione tensore:   {t_build:8.2f} ms (una tantum)")
+    print(f"Cicli Python:          {t_loops:8.2f} ms")
+    print(f"NumPy (vettoriale):    {t_vect:8.2f} ms  -> x{t_loops / t_vect:.0f}")
+    print(f"Cambio regolamento:    {t_rules:8.2f} ms (ricalcolo di tutto lo storico)")
@@ -0,0 +1,45 @@
+from bench_tensor import timeit
+from rules import DEFAULT_RULES, compile_ruleset
+from standings import ranking
+from synthetic import generate
+from tensor import ChampionshipTensor
+from whatif import RACE_SCALES, SKILL_SCALES, candidate_rulesets, sweep
+
+# --- BENCHMARK: STORICO RICALCOLATO CON CENTINAIA DI REGOLAMENTI ---
+# Uso: python bench_whatif.py [numero_giornate]
+# Griglia: 4 scale gara x 4 scale skill x 3 bonus skill x 3 bonus 12/12 x 3 bonus 5V x 2 soglie = 864
+GRID = (list(RACE_SCALES.values()), list(SKILL_SCALES.values()), [0, 5, 8], [0, 10, 20], [0, 5, 10], [4, 5])
+
+
+# Classifica di un solo regolamento con il codice della scheda GENERALE (per il controllo)
+def reference_order(tensor, rules):
+    totals, presences, media = tensor.standings(rules)
+    standings = {p: {"Totale": int(totals[i]), "Presenze": int(presences[i]), "Media": float(media[i])}
+                 for i, p in enumerate(tensor.players)}
+    return [row["Giocatore"] for row in ranking({"standings": standings})]
+
+
+if __name__ == "__main__":
+    import sys
+
+    n_days = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    data = generate(n_days)
+    candidates = candidate_rulesets(*GRID)
+    tensor = ChampionshipTensor.from_data(data)
+
+    result = sweep(tensor, DEFAULT_RULES, candidates)
+    for k in range(0, len(result["rules"]), 97):
+        order = [tensor.players[i] for i in result["ranks"][k].argsort()]
+        assert order == reference_order(tensor, result["rules"][k]), f"classifica diversa: {result['rules'][k].ruleset}"
+
+    t_build = timeit(lambda: ChampionshipTensor.from_data(data), repeat=3)
+    t_sweep = timeit(lambda: (tensor._memo.clear(), sweep(tensor, DEFAULT_RULES, candidates)))
+    t_warm = timeit(lambda: sweep(tensor, DEFAULT_RULES, candidates))
+    t_one = timeit(lambda: (tensor._memo.clear(), tensor.standings(compile_ruleset(candidates[-1]))))
+    print(f"Giornate: {n_days}, regolamenti: {len(candidates)}")
+    print(f"Costruzione tensore:        {t_build:8.2f} ms (una tantum per versione dei dati)")
+    print(f"Sweep (conteggi + totali):  {t_sweep:8.2f} ms")
+    print(f"Sweep (conteggi in cache):  {t_warm:8.2f} ms")
+    print(f"Un regolamento alla volta:  {t_one * len(candidates):8.2f} ms stimati ({t_one:.2f} ms l'uno)")
+    print(f"Cambiano il leader: {int((result['ranks'][1:, result['ranks'][0].argmin()] != 1).sum())} "
+          f"regolamenti su {len(candidates)}")
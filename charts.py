@@ -0,0 +1,75 @@
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# --- GRAFICI DELLE STATISTICHE ---
+# Costruiti a partire dallo storico cumulativo (data["timeline"], vedi timeline.py) invece di
+# ripercorrere tutte le giornate. Nell'app passano dalla cache dei grafici (figure_cache.py).
+
+
+def build_scalata_figure(timeline, players):
+    history_rows = []
+    n_days = len(timeline[players[0]]["avg"]) if players else 0
+    for day_idx in range(n_days):
+        for p in players:
+            history_rows.append({"Giornata": f"G{day_idx + 1}", "Giocatore": p, "Media": timeline[p]["avg"][day_idx]})
+
+    df_hist = pd.DataFrame(history_rows)
+    fig_line = px.line(df_hist, x="Giornata", y="Media", color="Giocatore", markers=True, symbol="Giocatore")
+    fig_line.update_layout(
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        margin=dict(l=20, r=20, t=20, b=20), xaxis_title=None, yaxis_title=None, showlegend=True
+    )
+    return fig_line
+
+
+def build_radar_figure(timeline, player, skill_max=17):
+    # Massimi possibili per presenza: 12 vittorie (12 gare), skill_max punti basket e freccette
+    # (1° posto + bonus del regolamento, 12 + 5 con quello ufficiale)
+    totals, games = timeline[player]["totals"], timeline[player]["cum_games"]
+    presences = games[-1] if games else 0
+    stats = {
+        "Wins_Actual": totals["wins"], "Wins_Max": presences * 12,
+        "Basket_Actual": totals["basket"], "Basket_Max": presences * skill_max,
+        "Darts_Actual": totals["darts"], "Darts_Max": presences * skill_max
+    }
+
+    categories = ['Vittorie (1°)', 'Canestri', 'Freccette']
+
+    # Calcolo percentuali (Gestione divisione per zero se uno non ha mai giocato)
+    perc_wins = (stats["Wins_Actual"] / stats["Wins_Max"] * 100) if stats["Wins_Max"] > 0 else 0
+    perc_basket = (stats["Basket_Actual"] / stats["Basket_Max"] * 100) if stats["Basket_Max"] > 0 else 0
+    perc_darts = (stats["Darts_Actual"] / stats["Darts_Max"] * 100) if stats["Darts_Max"] > 0 else 0
+
+    vals_perc = [perc_wins, perc_basket, perc_darts]
+
+    # Per il tooltip mostriamo anche i valori veri
+    hover_text = [
+        f"{stats['Wins_Actual']} su {stats['Wins_Max']} possibili",
+        f"{stats['Basket_Actual']} su {stats['Basket_Max']} possibili",
+        f"{stats['Darts_Actual']} su {stats['Darts_Max']} possibili"
+    ]
+
+    fig_radar = go.Figure()
+    fig_radar.add_trace(go.Scatterpolar(
+        r=vals_perc,
+        theta=categories,
+        fill='toself',
+        name=player,
+        line_color='#e0bc00',
+        text=hover_text,
+        hovertemplate="%{theta}: %{r:.1f}%<br>(%{text})<extra></extra>"
+    ))
+
+    fig_radar.update_layout(
+        polar=dict(
+            radialaxis=dict(
+                visible=True,
+                range=[0, 100],  # Scala fissa 0-100%
+                ticksuffix="%"
+            )
+        ),
+        showlegend=False,
+        margin=dict(l=40, r=40, t=20, b=20)
+    )
+    return fig_radar
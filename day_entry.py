@@ -0,0 +1,47 @@
+from scoring import RACES
+
+# --- INSERIMENTO DI UNA GIORNATA COMPLETA ---
+# L'admin compila in un solo modulo assenze, le 12 gare e le classifiche di basket e freccette;
+# qui si controlla che il modulo sia coerente e si costruisce la giornata da salvare in un colpo
+# solo (una scrittura invece di una per ogni gara, e nessuno stato intermedio per gli spettatori).
+# Piazzamenti delle gare 1-4 (0 = non inserito), skill come (posizione, bonus) con posizione
+# None se non inserita. Si salvano così come sono: i punti li calcola il regolamento (rules.py).
+
+
+def _duplicates(values, absent, players):
+    seen = {}
+    for i, value in enumerate(values):
+        if not absent[i] and value:
+            seen.setdefault(value, []).append(players[i])
+    return {value: names for value, names in seen.items() if len(names) > 1}
+
+
+# Errori del modulo (lista vuota = si può salvare): ogni posizione una sola volta per gara e per skill,
+# contando solo i presenti (gli assenti vengono azzerati comunque da build_day)
+def validate(players, absent, races, basket_ranks, darts_ranks):
+    errors = []
+    if all(absent):
+        errors.append("Tutti i giocatori risultano assenti.")
+    for race in RACES:
+        for placing, names in sorted(_duplicates(races[race], absent, players).items()):
+            errors.append(f"{race}: {placing}° posto assegnato a più giocatori ({', '.join(names)})")
+    for label, ranks in (("Basket", basket_ranks), ("Freccette", darts_ranks)):
+        for rank, names in sorted(_duplicates(ranks, absent, players).items()):
+            errors.append(f"{label}: {rank}° posto assegnato a più giocatori ({', '.join(names)})")
+    return errors
+
+
+def _skill_columns(entries, absent):
+    ranks = [0 if absent[i] or rank is None else rank for i, (rank, _) in enumerate(entries)]
+    bonus = [not absent[i] and rank is not None and bool(b) for i, (rank, b) in enumerate(entries)]
+    return ranks, bonus
+
+
+# Nuova giornata dal modulo; i campi non gestiti dal modulo restano quelli di day
+def build_day(day, absent, races, basket, darts):
+    new_day = dict(day)
+    new_day["absent"] = list(absent)
+    new_day["races"] = {race: [0 if absent[i] else v for i, v in enumerate(races[race])] for race in RACES}
+    new_day["basket"], new_day["basket_bonus"] = _skill_columns(basket, absent)
+    new_day["darts"], new_day["darts_bonus"] = _skill_columns(darts, absent)
+    return new_day
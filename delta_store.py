@@ -0,0 +1,271 @@
+import json
+import threading
+
+import profiler
+
+# --- LAYOUT SUL FOGLIO ---
+# "Giornate": una riga per giornata, una cella per campo (lista JSON dei 4 giocatori).
+# "Meta": A1 contiene tutto ciò che non è "giornate" (config, ...), B1 il numero di versione,
+# incrementato a ogni scrittura: leggerlo costa pochi byte e dice se serve riscaricare tutto.
+# Modificare un piazzamento riscrive una sola cella invece dell'intero campionato in A1.
+DAYS_SHEET = "Giornate"
+META_SHEET = "Meta"
+# I bonus di basket e freccette stanno dopo "Altro": aggiunti in seguito, in fondo, così le righe
+# scritte prima restano leggibili (celle vuote, completate dalla migrazione in migrations.py)
+RACES = [f"Gara {r + 1}" for r in range(12)]
+BONUS_FIELDS = ["basket_bonus", "darts_bonus"]
+FIELDS = ["absent", "basket", "darts"] + RACES + BONUS_FIELDS
+HEADER = ["Giornata", "Assenze", "Basket", "Freccette"] + RACES + ["Altro", "Bonus Basket", "Bonus Freccette"]
+EXTRA_COL = HEADER.index("Altro") + 1
+# Calcolati dai dati: classifica, storico cumulativo e versione del regolamento usato
+DERIVED_KEYS = ("standings", "timeline", "derived_rules")
+# Lo storico cumulativo cresce di ~120 byte per giornata: in Meta!A1 supererebbe il limite di 50000
+# caratteri della cella verso le 400 giornate. Non si salva: lo ricostruisce ensure_derived al caricamento
+UNSAVED_KEYS = ("giornate", "timeline")
+
+
+# Notazione A1 (riga 1, colonna 3 -> "C1"), senza importare gspread solo per questo
+def rowcol_to_a1(row, col):
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return f"{letters}{row}"
+
+
+LAST_COL = rowcol_to_a1(1, len(HEADER))[:-1]
+
+
+# Contenuto di Meta!A1: tutto tranne le giornate (una riga ciascuna) e lo storico
+def meta_json(data):
+    return json.dumps({k: v for k, v in data.items() if k not in UNSAVED_KEYS})
+
+
+def day_sort_key(day_key):
+    return int(day_key.split(" ")[1])
+
+
+def field_col(field):
+    if field in BONUS_FIELDS:
+        return EXTRA_COL + 1 + BONUS_FIELDS.index(field)
+    return FIELDS.index(field) + 2
+
+
+def cell_value(day, field):
+    if field in RACES:
+        return json.dumps(day["races"][field])
+    return json.dumps(day[field])
+
+
+def extra_value(day):
+    extra = {k: v for k, v in day.items() if k != "races" and k not in FIELDS}
+    return json.dumps(extra) if extra else ""
+
+
+def row_values(day_key, day):
+    row = [day_key] + [""] * (len(HEADER) - 1)
+    for f in FIELDS:
+        row[field_col(f) - 1] = cell_value(day, f)
+    row[EXTRA_COL - 1] = extra_value(day)
+    return row
+
+
+def parse_row(row):
+    row = row + [""] * (len(HEADER) - len(row))
+    day = {"races": {r: json.loads(row[field_col(r) - 1]) for r in RACES}}
+    for f in ["absent", "basket", "darts"] + BONUS_FIELDS:
+        if row[field_col(f) - 1]:
+            day[f] = json.loads(row[field_col(f) - 1])
+    if row[EXTRA_COL - 1]:
+        day.update(json.loads(row[EXTRA_COL - 1]))
+    return row[0], day
+
+
+class DeltaStore:
+    def __init__(self, pool):
+        self.pool = pool
+        # Copia di ciò che è sul foglio: {(riga, colonna): valore} e {giornata: riga}
+        self._cells = {}
+        self._rows = {}
+        self._meta = None
+        self._version = None
+        self._ready = False
+        # Finché il foglio non è stato letto (load) la copia locale è vuota: un delta calcolato
+        # su di essa riscriverebbe tutto e ripartirebbe dalla versione 1
+        self._loaded = False
+        # Scritture completate (_write_gen) e versione più alta vista sul foglio: un load() partito
+        # prima di una scrittura non deve riportare indietro la copia locale né la versione
+        self._write_gen = 0
+        self._remote_version = 0
+        self.lock = threading.RLock()
+        self.stats = {"saves": 0, "cells_written": 0, "cells_skipped": 0}
+
+    def _ensure_layout(self):
+        if self._ready:
+            return
+        self.pool.worksheet(DAYS_SHEET, create=(100, len(HEADER)))
+        self.pool.worksheet(META_SHEET, create=(10, 5))
+        if self.pool.call(lambda ws: ws.row_values(1), DAYS_SHEET) != HEADER:
+            self.pool.call(lambda ws: ws.update(range_name="A1", values=[HEADER]), DAYS_SHEET, kind="write")
+        self._ready = True
+
+    def load(self):
+        self._ensure_layout()
+        with self.lock:
+            gen = self._write_gen
+        with profiler.phase("Sheets: lettura"):
+            resp = self.pool.call_spreadsheet(
+                lambda sp: sp.values_batch_get([f"'{META_SHEET}'!A1:B1", f"'{DAYS_SHEET}'!A2:{LAST_COL}"]))
+        meta_range, days_range = resp["valueRanges"]
+        meta_row = meta_range.get("values", [[""]])[0] + ["", ""]
+        meta_raw, version = meta_row[0], int(meta_row[1] or 0)
+        if not meta_raw:
+            with self.lock:
+                if self._read_is_current(gen, version):
+                    self._version = version
+                self._loaded = True
+            return None
+
+        with profiler.phase("Deserializzazione"):
+            data = json.loads(meta_raw)
+            data["giornate"] = {}
+            cells, rows = {}, {}
+            for idx, row in enumerate(days_range.get("values", [])):
+                if not row or not row[0]:
+                    continue
+                day_key, day = parse_row(row)
+                data["giornate"][day_key] = day
+                rows[day_key] = idx + 2
+                for col, value in enumerate(row_values(day_key, day), start=1):
+                    cells[(idx + 2, col)] = value
+        if profiler.active():
+            profiler.count("Byte letti", len(meta_raw) + sum(len(v) for v in cells.values()))
+        with self.lock:
+            if self._read_is_current(gen, version):
+                self._version, self._cells, self._rows, self._meta = version, cells, rows, meta_raw
+            self._loaded = True
+        return data
+
+    # Da chiamare con il lock: registra la versione letta e dice se la lettura può sostituire la
+    # copia locale, cioè se nessuna scrittura è finita dopo che era partita
+    def _read_is_current(self, gen, version):
+        self._remote_version = max(self._remote_version, version)
+        return self._write_gen == gen
+
+    # Prossima versione da scrivere: mai una già usata, né qui né sul foglio
+    def _next_version(self):
+        return max(self._version or 0, self._remote_version) + 1
+
+    def loaded(self):
+        with self.lock:
+            return self._loaded
+
+    def _require_loaded(self):
+        if not self.loaded():
+            raise RuntimeError("Foglio non ancora letto: salvataggio rimandato a dopo il caricamento")
+
+    # Legge solo la cella della versione (None se il layout non esiste ancora)
+    def version(self):
+        self._ensure_layout()
+        with profiler.phase("Sheets: versione"):
+            resp = self.pool.call_spreadsheet(lambda sp: sp.values_get(f"'{META_SHEET}'!B1"))
+        values = resp.get("values")
+        version = int(values[0][0]) if values and values[0] and values[0][0] else None
+        if version is not None:
+            with self.lock:
+                self._remote_version = max(self._remote_version, version)
+        return version
+
+    # Delta da scrivere per portare il foglio allo stato di data: celle cambiate, meta (se cambiata)
+    # e nuova mappa giornata -> riga (se ricalcolata).
+    # dirty: lista di (giornata, campo) toccati; se None (o se contiene giornate nuove)
+    # si confronta l'intero campionato con la copia locale.
+    # pending: delta già accodati ma non ancora scritti, da considerare come se fossero sul foglio.
+    # author: chi ha fatto la modifica (per il registro eventi, vedi event_log.py)
+    def changes(self, data, dirty=None, pending=(), author=None):
+        self._require_loaded()
+        with self.lock:
+            base_cells, base_rows, base_meta = dict(self._cells), self._rows, self._meta
+        for delta in pending:
+            base_cells.update(delta["cells"])
+            if delta["rows"] is not None:
+                base_rows = delta["rows"]
+            if delta["meta"] is not None:
+                base_meta = delta["meta"]
+
+        desired = {}
+        rows = None
+        if dirty is not None and all(day_key in base_rows for day_key, _ in dirty):
+            for day_key, field in dirty:
+                desired[(base_rows[day_key], field_col(field))] = cell_value(data["giornate"][day_key], field)
+        else:
+            days = sorted(data["giornate"].keys(), key=day_sort_key)
+            rows = {}
+            for idx, day_key in enumerate(days):
+                rows[day_key] = idx + 2
+                for col, value in enumerate(row_values(day_key, data["giornate"][day_key]), start=1):
+                    desired[(idx + 2, col)] = value
+            # Righe rimaste orfane dopo l'eliminazione di una giornata: vanno svuotate
+            for (row, col), value in base_cells.items():
+                if row > len(days) + 1 and value != "":
+                    desired[(row, col)] = ""
+
+        cells = {}
+        for key, value in desired.items():
+            if base_cells.get(key, "") != value:
+                cells[key] = value
+            else:
+                self.stats["cells_skipped"] += 1
+
+        meta = meta_json(data)
+        return {"cells": cells, "meta": meta if meta != base_meta else None, "rows": rows, "author": author}
+
+    def write(self, delta):
+        cells, meta = delta["cells"], delta["meta"]
+        if cells or meta is not None:
+            self._require_loaded()
+            self._ensure_layout()
+            days_ws = self.pool.worksheet(DAYS_SHEET)
+            max_row = max((row for row, _ in cells), default=0)
+            if max_row > days_ws.row_count:
+                # Non idempotente (due tentativi = righe aggiunte due volte): si riprova solo sui 429
+                self.pool.call(lambda ws: ws.add_rows(max_row - ws.row_count + 50), DAYS_SHEET,
+                               kind="write", idempotent=False)
+            body = [{"range": f"'{DAYS_SHEET}'!{rowcol_to_a1(row, col)}", "values": [[value]]}
+                    for (row, col), value in cells.items()]
+            if meta is not None:
+                body.append({"range": f"'{META_SHEET}'!A1", "values": [[meta]]})
+            with self.lock:
+                version = self._next_version()
+            body.append({"range": f"'{META_SHEET}'!B1", "values": [[str(version)]]})
+            # Idempotente: celle fisse e versione già calcolata, ripetere la scrittura non cambia nulla
+            with profiler.phase("Sheets: scrittura"):
+                self.pool.call_spreadsheet(
+                    lambda sp: sp.values_batch_update({"valueInputOption": "RAW", "data": body}), kind="write")
+            if profiler.active():
+                profiler.count("Byte scritti", sum(len(item["values"][0][0]) for item in body))
+        with self.lock:
+            self._cells.update(cells)
+            if meta is not None:
+                self._meta = meta
+            if delta["rows"] is not None:
+                self._rows = delta["rows"]
+            if cells or meta is not None:
+                self._version = version
+                self._write_gen += 1
+                self.stats["saves"] += 1
+                self.stats["cells_written"] += len(cells) + (1 if meta is not None else 0)
+
+    def save(self, data, dirty=None):
+        self.write(self.changes(data, dirty))
+
+
+# Unisce due delta: i valori più recenti (b) vincono; gli autori si sommano
+def merge_deltas(a, b):
+    authors = [x for x in (a.get("author"), b.get("author")) if x]
+    return {
+        "cells": {**a["cells"], **b["cells"]},
+        "meta": b["meta"] if b["meta"] is not None else a["meta"],
+        "rows": b["rows"] if b["rows"] is not None else a["rows"],
+        "author": ", ".join(dict.fromkeys(", ".join(authors).split(", "))) if authors else None,
+    }
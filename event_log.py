@@ -0,0 +1,336 @@
+import json
+import time
+
+import profiler
+from delta_store import (DeltaStore, DAYS_SHEET, META_SHEET, HEADER, FIELDS, LAST_COL, DERIVED_KEYS,
+                         field_col, meta_json, parse_row, rowcol_to_a1)
+
+# --- REGISTRO EVENTI + ISTANTANEA PERIODICA ---
+# Ogni salvataggio diventa una riga in fondo a "Eventi" (numero, ora, autore, celle cambiate con
+# valore prima/dopo): una modifica a una gara scrive sempre la stessa quantità di dati, qualunque
+# sia la lunghezza del campionato, insieme al numero di versione in Meta!B1 in un'unica richiesta.
+# "Giornate" e Meta!A1 sono l'istantanea compattata: ogni SNAPSHOT_EVERY eventi vi si riportano le
+# celle cambiate nel frattempo e Meta!C1 dice fino a quale evento arriva. Chi carica legge
+# l'istantanea e applica solo gli eventi successivi (la coda, al massimo SNAPSHOT_EVERY righe).
+# Il registro è anche la cronologia: chi ha cambiato cosa e quando, e da lì si può annullare.
+EVENTS_SHEET = "Eventi"
+EVENTS_HEADER = ["N", "Ora", "Autore", "Modifiche"]
+SNAPSHOT_EVERY = 50
+# Un evento sta in una cella (massimo 50000 caratteri su Sheets): salvataggi più grandi (campionato
+# intero, giornata eliminata con rinumerazione) vanno direttamente nell'istantanea
+MAX_EVENT_CHARS = 40000
+
+
+def _cell_key(row, col):
+    return f"{row},{col}"
+
+
+def _parse_cell_key(key):
+    row, col = key.split(",")
+    return int(row), int(col)
+
+
+# Parte di meta (JSON) che conta per il registro: tutto tranne i dati derivati
+def _meta_fields(meta_raw):
+    meta = json.loads(meta_raw) if meta_raw else {}
+    return {k: v for k, v in meta.items() if k not in DERIVED_KEYS}
+
+
+def _meta_change(old_raw, new_raw):
+    old, new = _meta_fields(old_raw), _meta_fields(new_raw)
+    keys = sorted(k for k in set(old) | set(new) if old.get(k) != new.get(k))
+    if not keys:
+        return None
+    return {"prima": {k: old.get(k) for k in keys}, "dopo": {k: new.get(k) for k in keys}}
+
+
+# Campo della giornata per colonna del foglio (None per il nome della giornata e per "Altro")
+def column_field(col):
+    return next((f for f in FIELDS if field_col(f) == col), None)
+
+
+def _format_value(raw):
+    return "—" if raw == "" else raw
+
+
+# Cosa cambia per giocatore in una cella (liste JSON di 4 valori): "Pierino: 2 → 1"
+def _player_changes(old_raw, new_raw, players):
+    try:
+        old, new = json.loads(old_raw), json.loads(new_raw)
+    except ValueError:
+        return f"{_format_value(old_raw)} → {_format_value(new_raw)}"
+    if not isinstance(old, list) or not isinstance(new, list) or len(old) != len(new):
+        return f"{_format_value(old_raw)} → {_format_value(new_raw)}"
+    changed = [f"{players[i] if i < len(players) else i + 1}: {o} → {n}"
+               for i, (o, n) in enumerate(zip(old, new)) if o != n]
+    return ", ".join(changed) or "invariato"
+
+
+# Voci di meta cambiate, un livello più in dettaglio per i dizionari (es. "config.ruleset")
+def _meta_keys(change):
+    keys = []
+    for key, new in change["dopo"].items():
+        old = change["prima"].get(key)
+        if isinstance(old, dict) and isinstance(new, dict):
+            keys += [f"{key}.{k}" for k in sorted(set(old) | set(new)) if old.get(k) != new.get(k)]
+        else:
+            keys.append(key)
+    return keys
+
+
+# Righe leggibili del registro (una per cella cambiata) per la tabella dell'admin
+def describe_event(event, players):
+    base = {"N": event["n"], "Ora": event["ts"], "Autore": event["author"] or "—"}
+    if event["snapshot"]:
+        return [{**base, "Giornata": "—", "Campo": "Salvataggio completo",
+                 "Modifica": f"{event['size']} celle riscritte"}]
+    out = []
+    for key, (old, new) in sorted(event["cells"].items(), key=lambda kv: _parse_cell_key(kv[0])):
+        row, col = _parse_cell_key(key)
+        day_key = event["days"].get(str(row)) or f"riga {row}"
+        if col == 1:
+            out.append({**base, "Giornata": day_key, "Campo": "Giornata",
+                        "Modifica": "creata" if not old else "eliminata" if not new else f"{old} → {new}"})
+        elif column_field(col) is None:
+            out.append({**base, "Giornata": day_key, "Campo": HEADER[col - 1],
+                        "Modifica": f"{_format_value(old)} → {_format_value(new)}"})
+        elif old and new:
+            out.append({**base, "Giornata": day_key, "Campo": HEADER[col - 1],
+                        "Modifica": _player_changes(old, new, players)})
+    if event["meta"] is not None:
+        out.append({**base, "Giornata": "—", "Campo": "Impostazioni",
+                    "Modifica": ", ".join(_meta_keys(event["meta"]))})
+    return out
+
+
+# Come annullare un evento: [(giornata, campo, valore prima, valore dopo)], solo per modifiche di campi
+# di giornate esistenti (non creazione/eliminazione di giornate né impostazioni); None se non si può
+def undo_plan(event):
+    if event["snapshot"] or event["meta"] is not None or not event["cells"]:
+        return None
+    plan = []
+    for key, (old, new) in event["cells"].items():
+        row, col = _parse_cell_key(key)
+        field = column_field(col)
+        if field is None or not old or not new or not event["days"].get(str(row)):
+            return None
+        plan.append((event["days"][str(row)], field, json.loads(old), json.loads(new)))
+    return plan
+
+
+# Eventi annullabili tra events (dal più recente, come recent_events): {numero: piano}.
+# Ci si ferma alla prima istantanea o al primo evento che rinomina o elimina giornate: prima di lì
+# le righe del foglio potevano contenere altre giornate, e il nome salvato nell'evento non basta.
+# day_of_row: giornata attuale di una riga (EventLogStore.day_of_row)
+def undoable_events(events, day_of_row):
+    plans = {}
+    for event in events:
+        if event["snapshot"] or any(_parse_cell_key(key)[1] == 1 and old
+                                    for key, (old, _) in event["cells"].items()):
+            break
+        plan = undo_plan(event)
+        if plan is not None and all(day_of_row(int(row)) == day_key for row, day_key in event["days"].items()):
+            plans[event["n"]] = plan
+    return plans
+
+
+def _days_from_cells(cells):
+    giornate, rows = {}, {}
+    by_row = {}
+    for (row, col), value in cells.items():
+        by_row.setdefault(row, {})[col] = value
+    for row in sorted(by_row):
+        values = [by_row[row].get(col, "") for col in range(1, len(HEADER) + 1)]
+        if not values[0]:
+            continue
+        day_key, day = parse_row(values)
+        giornate[day_key] = day
+        rows[day_key] = row
+    return giornate, rows
+
+
+class EventLogStore(DeltaStore):
+    def __init__(self, pool):
+        super().__init__(pool)
+        # Cosa c'è davvero in "Giornate" e Meta!A1 (l'istantanea); _cells/_meta sono lo stato
+        # logico, istantanea + eventi
+        self._snapshot_cells = {}
+        self._snapshot_meta = None
+        self._snapshot_seq = 0
+        self._events_ready = False
+        self.stats.update({"events": 0, "snapshots": 0, "tail_events": 0})
+
+    def _ensure_layout(self):
+        super()._ensure_layout()
+        if self._events_ready:
+            return
+        self.pool.worksheet(EVENTS_SHEET, create=(1000, len(EVENTS_HEADER)))
+        if self.pool.call(lambda ws: ws.row_values(1), EVENTS_SHEET) != EVENTS_HEADER:
+            self.pool.call(lambda ws: ws.update(range_name="A1", values=[EVENTS_HEADER]), EVENTS_SHEET,
+                           kind="write")
+        self._events_ready = True
+
+    def load(self):
+        self._ensure_layout()
+        with self.lock:
+            gen = self._write_gen
+        with profiler.phase("Sheets: lettura"):
+            resp = self.pool.call_spreadsheet(
+                lambda sp: sp.values_batch_get([f"'{META_SHEET}'!A1:C1", f"'{DAYS_SHEET}'!A2:{LAST_COL}"]))
+        meta_range, days_range = resp["valueRanges"]
+        meta_row = meta_range.get("values", [[""]])[0] + ["", "", ""]
+        meta_raw, version = meta_row[0], int(meta_row[1] or 0)
+        # Fogli scritti prima del registro: l'istantanea arriva fino alla versione attuale
+        snapshot_seq = int(meta_row[2] or version)
+        if not meta_raw:
+            with self.lock:
+                if self._read_is_current(gen, version):
+                    self._version, self._snapshot_seq = version, snapshot_seq
+                self._loaded = True
+            return None
+
+        snapshot_cells = {}
+        for idx, row in enumerate(days_range.get("values", [])):
+            for col, value in enumerate(row, start=1):
+                if value != "":
+                    snapshot_cells[(idx + 2, col)] = value
+        tail = self.read_events(snapshot_seq + 1) if version > snapshot_seq else []
+
+        with profiler.phase("Deserializzazione"):
+            cells, meta = dict(snapshot_cells), json.loads(meta_raw)
+            for event in tail:
+                for key, (_, new) in event["cells"].items():
+                    cells[_parse_cell_key(key)] = new
+                if event["meta"] is not None:
+                    meta.update(event["meta"]["dopo"])
+            if tail:
+                # Classifica e storico dell'istantanea sono rimasti indietro: si ricalcolano
+                for key in DERIVED_KEYS:
+                    meta.pop(key, None)
+            data = dict(meta)
+            data["giornate"], rows = _days_from_cells(cells)
+        if profiler.active():
+            profiler.count("Byte letti", len(meta_raw) + sum(len(v) for v in snapshot_cells.values()))
+        with self.lock:
+            # Se intanto la coda ha scritto un evento, la copia locale è già più avanti di questa
+            # lettura: sostituirla farebbe riusare il numero dell'evento appena scritto
+            if self._read_is_current(gen, version):
+                self._version, self._snapshot_seq = version, snapshot_seq
+                self._snapshot_cells, self._snapshot_meta = snapshot_cells, meta_raw
+                self._cells, self._rows = {k: v for k, v in cells.items() if v != ""}, rows
+                self._meta = meta_json(data)
+            self._loaded = True
+            self.stats["tail_events"] = len(tail)
+        return data
+
+    # Eventi dal numero first in poi (fino a last compreso, se dato), in ordine
+    def read_events(self, first, last=None):
+        self._ensure_layout()
+        end = f"D{last + 1}" if last is not None else "D"
+        with profiler.phase("Sheets: registro"):
+            resp = self.pool.call_spreadsheet(lambda sp: sp.values_get(f"'{EVENTS_SHEET}'!A{first + 1}:{end}"))
+        events = []
+        for row in resp.get("values", []):
+            if len(row) < 4 or not row[0]:
+                continue
+            payload = json.loads(row[3])
+            events.append({"n": int(row[0]), "ts": row[1], "author": row[2],
+                           "cells": payload.get("celle", {}), "meta": payload.get("meta"),
+                           "days": payload.get("righe", {}), "snapshot": payload.get("istantanea", False),
+                           "size": payload.get("n_celle", 0)})
+        return events
+
+    # Ultimi limit eventi, dal più recente
+    def recent_events(self, limit=30):
+        with self.lock:
+            head = self._version or 0
+        if head == 0:
+            return []
+        return self.read_events(max(1, head - limit + 1), head)[::-1]
+
+    def write(self, delta):
+        cells, meta = delta["cells"], delta["meta"]
+        if not cells and meta is None:
+            with self.lock:
+                if delta["rows"] is not None:
+                    self._rows = delta["rows"]
+            return
+        self._require_loaded()
+        self._ensure_layout()
+        with self.lock:
+            base_cells, base_meta = dict(self._cells), self._meta
+            seq = self._next_version()
+            snapshot_cells, snapshot_seq = dict(self._snapshot_cells), self._snapshot_seq
+            first = self._snapshot_meta is None
+        new_meta = meta if meta is not None else base_meta
+        event = {"celle": {_cell_key(r, c): [base_cells.get((r, c), ""), v] for (r, c), v in cells.items()
+                           if base_cells.get((r, c), "") != v},
+                 "meta": _meta_change(base_meta, new_meta)}
+        # Nome della giornata di ogni riga toccata, così il registro resta leggibile anche dopo
+        # che le giornate sono state rinumerate
+        event["righe"] = {str(r): cells.get((r, 1)) or base_cells.get((r, 1), "")
+                          for r in {_parse_cell_key(k)[0] for k in event["celle"]}}
+        if not event["celle"] and event["meta"] is None:
+            # Cambiano solo classifica/storico (derivati): arriveranno con la prossima istantanea
+            with self.lock:
+                self._meta = new_meta
+                if delta["rows"] is not None:
+                    self._rows = delta["rows"]
+            return
+
+        payload = json.dumps(event)
+        # Il primo salvataggio su un foglio vuoto crea l'istantanea (Meta!A1 vuota = nessun campionato)
+        compact = first or len(payload) > MAX_EVENT_CHARS or seq - snapshot_seq >= SNAPSHOT_EVERY
+        if len(payload) > MAX_EVENT_CHARS:
+            # Nel registro resta solo la traccia: le celle sono nell'istantanea scritta insieme
+            payload = json.dumps({"istantanea": True, "celle": {}, "meta": event["meta"],
+                                  "righe": {}, "n_celle": len(event["celle"])})
+        row = [str(seq), time.strftime("%Y-%m-%d %H:%M:%S"), delta.get("author") or "", payload]
+        # C1 si riscrive a ogni evento: sui fogli di prima del registro non c'è ancora
+        body = [{"range": f"'{EVENTS_SHEET}'!A{seq + 1}", "values": [row]},
+                {"range": f"'{META_SHEET}'!B1", "values": [[str(seq), str(seq if compact else snapshot_seq)]]}]
+
+        current = {**base_cells, **cells}
+        snapshot_delta = {}
+        if compact:
+            for key in set(current) | set(snapshot_cells):
+                if current.get(key, "") != snapshot_cells.get(key, ""):
+                    snapshot_delta[key] = current.get(key, "")
+            body += [{"range": f"'{DAYS_SHEET}'!{rowcol_to_a1(r, c)}", "values": [[v]]}
+                     for (r, c), v in snapshot_delta.items()]
+            body.append({"range": f"'{META_SHEET}'!A1", "values": [[new_meta]]})
+            self._ensure_rows(DAYS_SHEET, max((r for r, _ in snapshot_delta), default=0))
+        self._ensure_rows(EVENTS_SHEET, seq + 1)
+
+        # Idempotente: righe e celle fisse, ripetere la richiesta non cambia nulla
+        with profiler.phase("Sheets: scrittura"):
+            self.pool.call_spreadsheet(
+                lambda sp: sp.values_batch_update({"valueInputOption": "RAW", "data": body}), kind="write")
+        if profiler.active():
+            profiler.count("Byte scritti", sum(len(v) for item in body for v in item["values"][0]))
+        with self.lock:
+            self._cells = {k: v for k, v in current.items() if v != ""}
+            self._meta = new_meta
+            if delta["rows"] is not None:
+                self._rows = delta["rows"]
+            self._version = seq
+            self._write_gen += 1
+            self.stats["saves"] += 1
+            self.stats["events"] += 1
+            self.stats["cells_written"] += len(event["celle"])
+            if compact:
+                self._snapshot_cells = dict(self._cells)
+                self._snapshot_meta, self._snapshot_seq = new_meta, seq
+                self.stats["snapshots"] += 1
+
+    def _ensure_rows(self, title, max_row):
+        ws = self.pool.worksheet(title)
+        if max_row > ws.row_count:
+            # Non idempotente (due tentativi = righe aggiunte due volte): si riprova solo sui 429
+            self.pool.call(lambda w: w.add_rows(max_row - w.row_count + 500), title,
+                           kind="write", idempotent=False)
+
+    # Giornata di una riga del foglio secondo lo stato attuale (per gli annullamenti, undoable_events)
+    def day_of_row(self, row):
+        with self.lock:
+            return next((day_key for day_key, r in self._rows.items() if r == row), None)
@@ -0,0 +1,168 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+
+# --- GOOGLE SHEETS FINTO IN MEMORIA ---
+# Stessa interfaccia usata da SheetPool/DeltaStore (open_by_url, values_batch_get/update, fogli...),
+# ma i dati restano in memoria. Simula i problemi delle serate affollate:
+# latency: secondi di attesa per ogni richiesta
+# quota_per_minute: oltre questo numero di letture (o scritture) nella finestra risponde 429
+# error_rate: probabilità di un 503 prima di applicare la richiesta
+# lost_response_rate: probabilità di un 503 *dopo* aver applicato una scrittura (risposta persa)
+# Uso: SheetPool({}, "fake://", client_factory=lambda: client) con client = FakeClient(...)
+
+
+class FakeAPIError(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+
+
+def a1_to_rowcol(a1):
+    match = re.match(r"([A-Z]+)(\d+)$", a1)
+    col = 0
+    for ch in match.group(1):
+        col = col * 26 + ord(ch) - ord("A") + 1
+    return int(match.group(2)), col
+
+
+class FakeWorksheet:
+    def __init__(self, client, title, rows=100, cols=26):
+        self.client = client
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self.cells = {}
+
+    def _row(self, row):
+        last = max((c for r, c in self.cells if r == row), default=0)
+        return [self.cells.get((row, c), "") for c in range(1, last + 1)]
+
+    def _set(self, row, col, values):
+        for i, values_row in enumerate(values):
+            for j, value in enumerate(values_row):
+                self.cells[(row + i, col + j)] = value
+
+    def row_values(self, row):
+        return self.client.request("read", lambda: self._row(row))
+
+    def update(self, range_name=None, values=None):
+        return self.client.request("write", lambda: self._set(*a1_to_rowcol(range_name), values))
+
+    def add_rows(self, n):
+        def apply():
+            self.row_count += n
+        return self.client.request("write", apply)
+
+    def acell(self, a1):
+        class Cell:
+            value = None
+        cell = Cell()
+        cell.value = self.client.request("read", lambda: self.cells.get(a1_to_rowcol(a1)))
+        return cell
+
+    def update_acell(self, a1, value):
+        return self.update(range_name=a1, values=[[value]])
+
+
+class FakeSpreadsheet:
+    def __init__(self, client):
+        self.client = client
+        self.sheets = {"Sheet1": FakeWorksheet(client, "Sheet1")}
+
+    @property
+    def sheet1(self):
+        return self.sheets["Sheet1"]
+
+    def worksheet(self, title):
+        from gspread.exceptions import WorksheetNotFound
+        if title not in self.sheets:
+            raise WorksheetNotFound(title)
+        return self.sheets[title]
+
+    def add_worksheet(self, title, rows, cols):
+        self.sheets[title] = FakeWorksheet(self.client, title, rows, cols)
+        return self.sheets[title]
+
+    def fetch_sheet_metadata(self):
+        return self.client.request("read", lambda: {"sheets": list(self.sheets)})
+
+    # "'Foglio'!A1:B1", "'Foglio'!A2:Q" (fino all'ultima riga piena) o "'Foglio'!B1"
+    def _read_range(self, rng):
+        title, a1 = rng.split("!")
+        ws = self.sheets[title.strip("'")]
+        start, _, end = a1.partition(":")
+        row0, col0 = a1_to_rowcol(start)
+        if not end:
+            row1, col1 = row0, col0
+        elif end[-1].isdigit():
+            row1, col1 = a1_to_rowcol(end)
+        else:
+            row1 = max((r for r, _ in ws.cells), default=row0)
+            col1 = a1_to_rowcol(end + "1")[1]
+        values = []
+        for row in range(row0, row1 + 1):
+            values_row = [ws.cells.get((row, col), "") for col in range(col0, col1 + 1)]
+            while values_row and values_row[-1] == "":
+                values_row.pop()
+            values.append(values_row)
+        while values and not values[-1]:
+            values.pop()
+        return {"range": rng, "values": values} if values else {"range": rng}
+
+    def values_batch_get(self, ranges):
+        return self.client.request("read", lambda: {"valueRanges": [self._read_range(r) for r in ranges]})
+
+    def values_get(self, rng):
+        return self.client.request("read", lambda: self._read_range(rng))
+
+    def values_batch_update(self, body):
+        def apply():
+            for item in body["data"]:
+                title, a1 = item["range"].split("!")
+                self.sheets[title.strip("'")]._set(*a1_to_rowcol(a1), item["values"])
+        return self.client.request("write", apply)
+
+
+class FakeClient:
+    def __init__(self, latency=0.0, quota_per_minute=None, error_rate=0.0, lost_response_rate=0.0,
+                 window=60.0, seed=None):
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.lost_response_rate = lost_response_rate
+        self.window = window
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = {"read": deque(), "write": deque()}
+        self.spreadsheet = FakeSpreadsheet(self)
+        self.stats = {"read": 0, "write": 0, "rejected_429": 0, "errors_503": 0, "lost_responses": 0,
+                      "peak_read": 0, "peak_write": 0}
+
+    def open_by_url(self, url):
+        return self.spreadsheet
+
+    def request(self, kind, apply):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            now = time.monotonic()
+            recent = self._recent[kind]
+            while recent and recent[0] <= now - self.window:
+                recent.popleft()
+            if self.quota_per_minute is not None and len(recent) >= self.quota_per_minute:
+                self.stats["rejected_429"] += 1
+                raise FakeAPIError(429, f"Quota exceeded for quota metric '{kind} requests'")
+            recent.append(now)
+            self.stats[kind] += 1
+            self.stats[f"peak_{kind}"] = max(self.stats[f"peak_{kind}"], len(recent))
+            if self._random.random() < self.error_rate:
+                self.stats["errors_503"] += 1
+                raise FakeAPIError(503, "The service is currently unavailable.")
+            result = apply()
+            if kind == "write" and self._random.random() < self.lost_response_rate:
+                self.stats["lost_responses"] += 1
+                raise FakeAPIError(503, "Backend error (response lost)")
+            return result
@@ -0,0 +1,52 @@
+import threading
+import time
+from collections import OrderedDict
+
+# --- CACHE DEI GRAFICI ---
+# I grafici Plotly vengono costruiti una volta per (versione dati, grafico, giocatore, tema) e poi
+# riusati da tutte le sessioni finché i dati non cambiano. Dimensione limitata: quando è piena
+# si scarta il grafico usato meno di recente (LRU).
+MAX_FIGURES = 64
+
+
+class FigureCache:
+    def __init__(self, max_size=MAX_FIGURES):
+        self.max_size = max_size
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "last_build_ms": 0.0, "total_build_ms": 0.0}
+
+    # key: (versione, grafico, giocatore, tema); build: funzione senza argomenti che crea il grafico
+    def get(self, key, build):
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._figures[key]
+        start = time.perf_counter()
+        fig = build()
+        build_ms = round((time.perf_counter() - start) * 1000, 1)
+        with self._lock:
+            self.stats["misses"] += 1
+            self.stats["last_build_ms"] = build_ms
+            self.stats["total_build_ms"] += build_ms
+            self._figures[key] = fig
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.max_size:
+                self._figures.popitem(last=False)
+                self.stats["evictions"] += 1
+        return fig
+
+    def hit_ratio(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def avg_build_ms(self):
+        return round(self.stats["total_build_ms"] / self.stats["misses"], 1) if self.stats["misses"] else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+
+    def __len__(self):
+        return len(self._figures)
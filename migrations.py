@@ -0,0 +1,109 @@
+# --- VERSIONI DELLO SCHEMA DEI DATI ---
+# data["schema"] dice a che versione sono i dati salvati; migrate() applica in ordine le migrazioni
+# mancanti. Chi carica dal backend (VersionedLoader in storage.py) riscrive subito i dati aggiornati:
+# ogni migrazione gira una volta sola e i caricamenti successivi non devono correggere nulla.
+# Senza "schema" (versione 0) ci sono i formati vecchi: dati_campionato.json di torneo_v5New.py e
+# DUMMY_DATA di reset_db.py, con gare a 10/7/4/2 punti, il campo "ko" e a volte senza "absent".
+SCHEMA_VERSION = 4
+
+LEGACY_RACE_POINTS = {10: 4, 7: 3, 4: 2, 2: 1, 0: 0}
+WIN_POINTS = 4
+# Punti salvati fino alla versione 3 -> piazzamento (gare) e posizione (basket/freccette, bonus +5)
+STORED_RACE_PLACINGS = {4: 1, 3: 2, 2: 3, 1: 4, 0: 0}
+STORED_SKILL_POINTS = {1: 12, 2: 9, 3: 6, 4: 3}
+STORED_SKILL_BONUS = 5
+# Segna (solo durante migrate) le giornate di torneo_v5New.py, dove basket e freccette sono punti
+# fatti in partita (basket fino a 9, freccette fino a 12) e non punti classifica 12/9/6/3 (+5)
+RAW_SKILLS_MARK = "_raw_skills"
+
+
+# 1: "absent" per ogni giornata (i file più vecchi non lo avevano)
+def _add_absent(data):
+    n_players = len(data["config"]["players"])
+    for day in data["giornate"].values():
+        day.setdefault("absent", [False] * n_players)
+
+
+# Giornata nel formato di torneo_v5New.py: ha il campo "ko" o gare a 10/7/4/2 (oltre i 4 punti).
+# Va riconosciuta prima che le migrazioni 2 e 3 tolgano entrambe le tracce
+def _mark_raw_skills(day):
+    if "ko" in day or any(v > WIN_POINTS for placings in day["races"].values() for v in placings):
+        day[RAW_SKILLS_MARK] = True
+
+
+# 2: piazzamenti da 10/7/4/2 a 4/3/2/1. 4 e 2 esistono in entrambe le scale, quindi si riconosce
+# una giornata vecchia da un piazzamento oltre i 4 punti (c'è sempre un primo posto da 10)
+def _rescale_races(data):
+    for day in data["giornate"].values():
+        _mark_raw_skills(day)
+        if any(v > WIN_POINTS for placings in day["races"].values() for v in placings):
+            day["races"] = {race: [LEGACY_RACE_POINTS.get(v, v) for v in placings]
+                            for race, placings in day["races"].items()}
+    # Classifica e storico salvati erano calcolati sui punti vecchi: si ricalcolano
+    data.pop("standings", None)
+    data.pop("timeline", None)
+
+
+# 3: i KO non fanno parte del punteggio dalla versione cloud
+def _drop_ko(data):
+    for day in data["giornate"].values():
+        _mark_raw_skills(day)
+        day.pop("ko", None)
+
+
+# raw: punti fatti in partita (giornate di torneo_v5New.py), da ordinare sempre
+def _skill_ranks(points, absent, raw=False):
+    by_points = {p: rank for rank, p in STORED_SKILL_POINTS.items()}
+    entries = []
+    for p in points:
+        if p == 0:  # non inserito (o assente)
+            entries.append((0, False))
+        elif p in by_points:
+            entries.append((by_points[p], False))
+        elif p - STORED_SKILL_BONUS in by_points:
+            entries.append((by_points[p - STORED_SKILL_BONUS], True))
+        else:
+            entries.append(None)
+    given = [e[0] for e, a in zip(entries, absent) if e is not None and e[0] and not a]
+    if not raw and None not in entries and len(given) == len(set(given)):
+        return [rank for rank, _ in entries], [bonus for _, bonus in entries]
+    # Punti fuori scala o posizioni ripetute: la posizione si ricava ordinando i presenti per punti.
+    # Con i punti fatti in partita anche 0 è un risultato (ultimo), se qualcuno ha segnato
+    scored = raw and any(p > 0 for p, a in zip(points, absent) if not a)
+    present = sorted((i for i, a in enumerate(absent) if not a and (points[i] > 0 or scored)),
+                     key=lambda i: -points[i])
+    ranks = [0] * len(points)
+    for pos, i in enumerate(present[:len(STORED_SKILL_POINTS)]):
+        ranks[i] = pos + 1
+    return ranks, [False] * len(points)
+
+
+# 4: le giornate salvano piazzamenti e posizioni, i punti li calcola il regolamento (rules.py)
+def _store_placings(data):
+    for day in data["giornate"].values():
+        day["races"] = {race: [STORED_RACE_PLACINGS.get(v, 0) for v in placings]
+                        for race, placings in day["races"].items()}
+        raw = day.pop(RAW_SKILLS_MARK, False)
+        for field in ("basket", "darts"):
+            day[field], day[f"{field}_bonus"] = _skill_ranks(day[field], day["absent"], raw)
+    data.pop("standings", None)
+    data.pop("timeline", None)
+
+
+MIGRATIONS = [(1, _add_absent), (2, _rescale_races), (3, _drop_ko), (4, _store_placings)]
+
+
+def schema_version(data):
+    return data.get("schema", 0)
+
+
+# Porta data all'ultima versione (modificandolo); restituisce True se ha cambiato qualcosa
+def migrate(data):
+    current = schema_version(data)
+    if current >= SCHEMA_VERSION:
+        return False
+    for version, step in MIGRATIONS:
+        if version > current:
+            step(data)
+    data["schema"] = SCHEMA_VERSION
+    return True
@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+import time
+
+from delta_store import DERIVED_KEYS
+
+# --- COPIA LOCALE E DIARIO DELLE MODIFICHE (OFFLINE-FIRST) ---
+# snapshot: l'ultimo campionato scaricato dal backend remoto, salvato su disco. All'avvio si mostra
+# subito questo mentre in background si scarica la versione aggiornata (stale-while-revalidate),
+# e se il backend non risponde si continua a lavorare su questo invece che su un campionato vuoto.
+# journal: una riga JSON per ogni salvataggio non ancora confermato dal backend, con le sole
+# giornate toccate. Al ritorno della connessione (o al riavvio) le modifiche vengono riapplicate.
+SNAPSHOT_FILE = "snapshot_campionato.json"
+JOURNAL_FILE = "journal_campionato.jsonl"
+
+
+class OfflineStore:
+    def __init__(self, snapshot_path=SNAPSHOT_FILE, journal_path=JOURNAL_FILE):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self._lock = threading.RLock()
+        self._seq = max((e["seq"] for e in self.pending()), default=0)
+        self._refresh = None
+        self.last_refresh_error = None
+        self.last_refresh_at = None
+        self.stats = {"recorded": 0, "replayed": 0, "refreshes": 0, "snapshots": 0}
+
+    # --- SNAPSHOT ---
+    # (versione, dati) dell'ultima copia salvata, o None se non ce n'è ancora una
+    def read_snapshot(self):
+        try:
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return snapshot["version"], snapshot["data"]
+
+    def write_snapshot(self, version, data):
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                json.dump({"version": version, "saved_at": time.time(), "data": data}, f)
+            os.replace(tmp_path, self.snapshot_path)
+            self.stats["snapshots"] += 1
+
+    # Scrittura su disco fuori dal rerun: data è l'istantanea condivisa, che nessuno modifica
+    def write_snapshot_async(self, version, data):
+        threading.Thread(target=self.write_snapshot, args=(version, data), name="snapshot", daemon=True).start()
+
+    def snapshot_age(self):
+        try:
+            return time.time() - os.path.getmtime(self.snapshot_path)
+        except FileNotFoundError:
+            return None
+
+    # --- DIARIO DELLE MODIFICHE ---
+    # dirty: lista di (giornata, campo) come in save_data; None = salvataggio completo.
+    # Restituisce il numero progressivo da confermare (confirm) quando il backend ha scritto.
+    def record(self, data, dirty=None):
+        with self._lock:
+            self._seq += 1
+            entry = {"seq": self._seq, "ts": time.time()}
+            if dirty is None:
+                # Lo storico si ricostruisce (ensure_derived) e non va nemmeno sul foglio (meta_json)
+                entry["data"] = {k: v for k, v in data.items() if k != "timeline"}
+            else:
+                entry["dirty"] = [list(d) for d in dirty]
+                entry["giornate"] = {day_key: data["giornate"][day_key] for day_key, _ in dirty}
+                # Classifica e storico si ricalcolano (ensure_derived): non si riscrivono a ogni clic
+                entry["meta"] = {k: v for k, v in data.items() if k != "giornate" and k not in DERIVED_KEYS}
+            with open(self.journal_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self.stats["recorded"] += 1
+            return self._seq
+
+    def pending(self):
+        try:
+            with open(self.journal_path, "r") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    # Toglie dal diario tutte le modifiche fino a seq compreso (già scritte sul backend)
+    def confirm(self, seq):
+        self._keep(lambda e: e["seq"] > seq)
+
+    # Toglie dal diario solo la modifica seq (es. un salvataggio che non cambiava nulla): quelle
+    # prima possono essere ancora in coda, non scritte
+    def confirm_one(self, seq):
+        self._keep(lambda e: e["seq"] != seq)
+
+    def _keep(self, keep):
+        with self._lock:
+            remaining = [e for e in self.pending() if keep(e)]
+            tmp_path = f"{self.journal_path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.writelines(json.dumps(e) + "\n" for e in remaining)
+            os.replace(tmp_path, self.journal_path)
+
+    # Snapshot + diario: lo stato più recente noto in locale, e i campi da riscrivere sul backend
+    # (dirty None se nel diario c'è un salvataggio completo)
+    def local_state(self):
+        snapshot = self.read_snapshot()
+        data = snapshot[1] if snapshot is not None else None
+        dirty = []
+        for entry in self.pending():
+            if "data" in entry:
+                data, dirty = entry["data"], None
+                continue
+            if data is None:
+                continue
+            data.update(entry["meta"])
+            data["giornate"].update(entry["giornate"])
+            # Classifica e storico della copia locale non tengono conto delle modifiche del diario
+            for key in DERIVED_KEYS:
+                data.pop(key, None)
+            if dirty is not None:
+                dirty.extend(tuple(d) for d in entry["dirty"])
+        return data, dirty
+
+    # Riscrive sul backend le modifiche in sospeso; restituisce quante erano
+    def replay(self, backend):
+        with self._lock:
+            entries = self.pending()
+            if not entries:
+                return 0
+            data, dirty = self.local_state()
+            if data is None:
+                return 0
+            if dirty is None:
+                backend.save(data)
+            else:
+                backend.update(data, dirty)
+            self.confirm(entries[-1]["seq"])
+            self.stats["replayed"] += len(entries)
+            return len(entries)
+
+    # --- AGGIORNAMENTO IN BACKGROUND ---
+    # Un solo thread alla volta: riapplica il diario e poi scarica la versione aggiornata con loader
+    def refresh_async(self, loader):
+        with self._lock:
+            if self._refresh is not None and self._refresh.is_alive():
+                return
+            self._refresh = threading.Thread(target=self._do_refresh, args=(loader,), name="refresh", daemon=True)
+            self._refresh.start()
+
+    def refreshing(self):
+        return self._refresh is not None and self._refresh.is_alive()
+
+    def _do_refresh(self, loader):
+        try:
+            if self.pending():
+                # Prima si legge il backend (su Sheets serve a sapere cosa c'è già), poi si riscrive
+                loader.backend.load()
+                self.replay(loader.backend)
+            loader.load_versioned()
+            self.last_refresh_error = None
+        except Exception as e:
+            self.last_refresh_error = str(e)
+        self.last_refresh_at = time.monotonic()
+        self.stats["refreshes"] += 1
@@ -0,0 +1,77 @@
+import csv
+import io
+import threading
+import time
+from contextlib import contextmanager
+
+# --- PROFILAZIONE DEI RERUN ---
+# Misura quanto costa ogni fase di un rerun (autorizzazione, letture/scritture Sheets, parsing,
+# schede, grafici) e conta richieste e byte trasferiti. La misura è attiva solo tra start() e
+# stop() nel thread dello script: altrimenti phase() e count() non fanno nulla (un solo getattr),
+# quindi la strumentazione può restare nel codice dei backend senza costi.
+_local = threading.local()
+
+
+def start(kind):
+    _local.current = {"ora": time.strftime("%H:%M:%S"), "tipo": kind, "phases": {}, "counters": {},
+                      "_start": time.perf_counter()}
+
+
+# Chiude la misura in corso e la restituisce (None se non ce n'era una)
+def stop():
+    record = getattr(_local, "current", None)
+    _local.current = None
+    if record is not None:
+        record["totale_ms"] = round((time.perf_counter() - record.pop("_start")) * 1000, 1)
+    return record
+
+
+def active():
+    return getattr(_local, "current", None) is not None
+
+
+# Tempo della fase name (in ms, sommato se la fase si ripete nello stesso rerun)
+@contextmanager
+def phase(name):
+    record = getattr(_local, "current", None)
+    if record is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start_time) * 1000
+        record["phases"][name] = round(record["phases"].get(name, 0) + elapsed, 1)
+
+
+def count(name, n=1):
+    record = getattr(_local, "current", None)
+    if record is not None:
+        record["counters"][name] = record["counters"].get(name, 0) + n
+
+
+# Un rerun per riga nel formato lungo: rerun, ora, tipo, misura, valore
+def to_csv(records):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["rerun", "ora", "tipo", "misura", "valore"])
+    for idx, record in enumerate(records, start=1):
+        writer.writerow([idx, record["ora"], record["tipo"], "totale_ms", record["totale_ms"]])
+        for name, value in record["phases"].items():
+            writer.writerow([idx, record["ora"], record["tipo"], f"{name} (ms)", value])
+        for name, value in record["counters"].items():
+            writer.writerow([idx, record["ora"], record["tipo"], name, value])
+    return out.getvalue()
+
+
+# Media e massimo di ogni misura sugli ultimi rerun: {misura: (media, massimo, occorrenze)}
+def summary(records):
+    values = {}
+    for record in records:
+        values.setdefault("totale_ms", []).append(record["totale_ms"])
+        for name, value in record["phases"].items():
+            values.setdefault(f"{name} (ms)", []).append(value)
+        for name, value in record["counters"].items():
+            values.setdefault(name, []).append(value)
+    return {name: (round(sum(v) / len(v), 1), max(v), len(v)) for name, v in values.items()}
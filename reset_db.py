@@ -1,7 +1,10 @@
-import json
-import gspread
+import sys
+
 import streamlit as st
-from oauth2client.service_account import ServiceAccountCredentials
+from sheets import SheetPool
+from migrations import migrate
+from storage import open_backend
+from synthetic import generate
 
 # --- CONFIGURA QUI I DATI DA SCRIVERE ---
 DUMMY_DATA = {
@@ -23,16 +26,22 @@ DUMMY_DATA = {
 }
 
 # --- CONNESSIONE ---
-scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
 # Assumendo che tu stia eseguendo questo localmente e abbia accesso ai secrets tramite .streamlit/secrets.toml
 # Se non funziona, puoi incollare qui il dizionario delle credenziali manualmente
-creds_dict = dict(st.secrets["gcp_service_account"])
-creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-client = gspread.authorize(creds)
-sheet = client.open_by_url(st.secrets["private_sheet_url"]).sheet1
+# Con TORNEO_STORAGE_BACKEND=local scrive invece su dati_campionato.json (nessun secret necessario)
+try:
+    settings = dict(st.secrets.get("storage", {}))
+except FileNotFoundError:
+    settings = {}
+backend = open_backend(settings, lambda: SheetPool(dict(st.secrets["gcp_service_account"]),
+                                                   st.secrets["private_sheet_url"]))
 
 # --- SCRITTURA ---
+# Uso: python reset_db.py [numero_giornate]
+# Con un numero scrive un campionato sintetico di quella durata (vedi synthetic.py) invece di DUMMY_DATA
+data = generate(int(sys.argv[1])) if len(sys.argv) > 1 else DUMMY_DATA
+migrate(data)  # DUMMY_DATA è nel formato vecchio (10/7/4/2, "ko"): si scrive già aggiornato
 print("Scrittura in corso...")
-json_str = json.dumps(DUMMY_DATA)
-sheet.update_acell('A1', json_str)
-print("✅ FATTO! Database ripopolato correttamente.")
\ No newline at end of file
+backend.load()  # su Sheets serve a sapere quali righe esistono già, per svuotare quelle in eccesso
+backend.save(data)
+print("✅ FATTO! Database ripopolato correttamente.")
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import threading
+
+# --- REGOLE DI PUNTEGGIO ---
+# Le giornate salvano piazzamenti e bonus, non punti: i punti li decide il regolamento, descritto
+# come dati (scale e bonus) e compilato una volta sola in tabelle di conversione, in cache per
+# versione (hash del contenuto). Cambiare regolamento vuol dire ricalcolare lo storico, non riscriverlo.
+# Piazzamenti e posizioni: 1-4, 0 = non inserito (0 punti).
+DEFAULT_RULESET = {
+    "race_points": [4, 3, 2, 1],    # punti in gara per 1°, 2°, 3°, 4° posto
+    "skill_points": [12, 9, 6, 3],  # basket e freccette, per posizione
+    "skill_bonus": 5,               # >= 20 punti a basket, chiusura entro 3 round a freccette
+    "grand_slam_bonus": 10,         # tutte le gare della giornata vinte
+    "five_wins_bonus": 5,
+    "five_wins_min": 5,             # vittorie necessarie per il bonus
+}
+# Scale discusse in modifiche.md: l'autore preferisce 12-9-6-3, l'alternativa è 12-8-4-0
+PRESETS = {
+    "Ufficiale (12-9-6-3)": DEFAULT_RULESET,
+    "Alternativa skill (12-8-4-0)": {**DEFAULT_RULESET, "skill_points": [12, 8, 4, 0]},
+}
+N_PLACES = 4
+MAX_COMPILED = 1024
+
+_compiled = {}
+_lock = threading.Lock()
+
+
+def ruleset_key(ruleset):
+    return hashlib.sha1(json.dumps(ruleset, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def validate_ruleset(ruleset):
+    missing = [k for k in DEFAULT_RULESET if k not in ruleset]
+    if missing:
+        raise ValueError(f"Regolamento incompleto, mancano: {', '.join(missing)}")
+    for k in ("race_points", "skill_points"):
+        if len(ruleset[k]) != N_PLACES:
+            raise ValueError(f"{k}: servono {N_PLACES} valori (uno per posizione), trovati {len(ruleset[k])}")
+    if any(v < 0 for k in ("race_points", "skill_points") for v in ruleset[k]):
+        raise ValueError("I punti per posizione non possono essere negativi")
+
+
+# Regolamento pronto per il calcolo: tabelle indicizzate per piazzamento (indice 0 = non inserito)
+class CompiledRuleset:
+    def __init__(self, ruleset):
+        validate_ruleset(ruleset)
+        self.ruleset = {k: ruleset[k] for k in DEFAULT_RULESET}
+        self.key = ruleset_key(self.ruleset)
+        self.race_table = (0,) + tuple(ruleset["race_points"])
+        self.skill_table = (0,) + tuple(ruleset["skill_points"])
+        self.skill_bonus = ruleset["skill_bonus"]
+        self.grand_slam_bonus = ruleset["grand_slam_bonus"]
+        self.five_wins_bonus = ruleset["five_wins_bonus"]
+        self.five_wins_min = ruleset["five_wins_min"]
+        # Massimo per presenza di basket e freccette (radar delle statistiche)
+        self.skill_max = max(self.skill_table) + self.skill_bonus
+
+    def skill(self, rank, bonus):
+        return self.skill_table[rank] + (self.skill_bonus if bonus else 0)
+
+
+def compile_ruleset(ruleset):
+    key = ruleset_key(ruleset)
+    rules = _compiled.get(key)
+    if rules is None:
+        rules = CompiledRuleset(ruleset)
+        with _lock:
+            if len(_compiled) >= MAX_COMPILED:
+                _compiled.pop(next(iter(_compiled)))
+            _compiled[key] = rules
+    return rules
+
+
+# Regolamento in vigore per un campionato (data["config"]["ruleset"], altrimenti quello ufficiale)
+def data_rules(data):
+    return compile_ruleset(data["config"].get("ruleset", DEFAULT_RULESET))
+
+
+DEFAULT_RULES = compile_ruleset(DEFAULT_RULESET)
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from rules import DEFAULT_RULES, data_rules
+
+# --- MOTORE PUNTEGGI ---
+# Il punteggio di una giornata viene calcolato una sola volta e memorizzato in base al contenuto
+# della giornata stessa e al regolamento (vedi rules.py): finché non cambiano, tutte le schede
+# (GIORNATA, GENERALE, STATISTICHE) riusano lo stesso risultato.
+# Una giornata salva piazzamenti (races, 1-4, 0 = non inserito), posizioni di basket e freccette
+# (basket/darts, 1-4 o 0) e i relativi bonus (basket_bonus/darts_bonus), mai punti.
+RACES = [f"Gara {r + 1}" for r in range(12)]
+# Voci minime della cache (LRU). Un campionato intero deve starci tutto: scorrerlo in ordine con
+# una cache più piccola scarterebbe ogni giornata prima di rileggerla, quindi championship_scores
+# la allarga al numero di giornate (più MAX_CACHE per le altre voci)
+MAX_CACHE = 4096
+
+_cache = OrderedDict()
+_capacity = MAX_CACHE
+_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0}
+
+
+def day_hash(day):
+    return hashlib.sha1(json.dumps(day, sort_keys=True).encode()).hexdigest()
+
+
+def empty_day(n_players):
+    return {"races": {r: [0] * n_players for r in RACES}, "absent": [False] * n_players,
+            "basket": [0] * n_players, "darts": [0] * n_players,
+            "basket_bonus": [False] * n_players, "darts_bonus": [False] * n_players}
+
+
+def compute_day(day, rules=DEFAULT_RULES):
+    scores = []
+    for i, is_absent in enumerate(day["absent"]):
+        if is_absent:
+            scores.append(None)
+            continue
+        placings = [day["races"][r][i] for r in RACES]
+        wins = placings.count(1)
+        mk8 = sum(rules.race_table[p] for p in placings)
+        bonus_gs = rules.grand_slam_bonus if wins == len(RACES) else 0
+        bonus_5w = rules.five_wins_bonus if wins >= rules.five_wins_min else 0
+        basket = rules.skill(day["basket"][i], day["basket_bonus"][i])
+        darts = rules.skill(day["darts"][i], day["darts_bonus"][i])
+        scores.append({
+            "mk8": mk8, "wins": wins,
+            "basket": basket, "darts": darts, "skill": basket + darts,
+            "bonus_gs": bonus_gs, "bonus_5w": bonus_5w,
+            "total": mk8 + basket + darts + bonus_gs + bonus_5w,
+        })
+    return scores
+
+
+# Punteggi della giornata per indice giocatore (None = assente).
+# Il risultato è condiviso dalla cache: non va modificato.
+def day_scores(day, rules=DEFAULT_RULES):
+    key = (rules.key, day_hash(day))
+    with _lock:
+        scores = _cache.get(key)
+        if scores is not None:
+            _cache.move_to_end(key)
+    if scores is not None:
+        stats["hits"] += 1
+        return scores
+    stats["misses"] += 1
+    scores = compute_day(day, rules)
+    with _lock:
+        _cache[key] = scores
+        while len(_cache) > _capacity:
+            _cache.popitem(last=False)
+    return scores
+
+
+# Spazio in cache per almeno n giornate (non si restringe mai)
+def reserve(n):
+    global _capacity
+    with _lock:
+        _capacity = max(_capacity, n + MAX_CACHE)
+
+
+# Punteggi di tutte le giornate nell'ordine dato, con il regolamento del campionato: {giornata: day_scores}
+def championship_scores(data, giornate_sorted):
+    rules = data_rules(data)
+    reserve(len(giornate_sorted))
+    return {d: day_scores(data["giornate"][d], rules) for d in giornate_sorted}
@@ -0,0 +1,227 @@
+import random
+import threading
+import time
+from collections import deque
+
+import profiler
+
+SCOPE = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+
+# --- QUOTE DI GOOGLE SHEETS ---
+# Limiti dell'API per utente: 60 letture e 60 scritture al minuto. Un salvataggio (write) o una
+# lettura della versione (read) sono una richiesta ciascuno, quindi nelle serate affollate
+# (spettatori in diretta + admin che salva a ogni clic) si arriva al limite.
+READ_QUOTA_PER_MINUTE = 60
+WRITE_QUOTA_PER_MINUTE = 60
+QUOTA_WINDOW_SECONDS = 60.0
+# Richieste che possono partire di fila senza attesa; il resto del minuto si riempie a ritmo
+# costante, con burst + ritmo * 60 s = quota: in nessun minuto si supera il limite
+QUOTA_BURST = 10
+# Su 429 (quota superata) e 5xx si riprova attendendo 1, 2, 4, 8, 16 s (+ fino a 1 s casuale)
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 32.0
+
+
+# Codice HTTP di un errore gspread (None per errori di rete o senza risposta)
+def error_status(e):
+    code = getattr(e, "code", None)
+    if isinstance(code, int):
+        return code
+    return getattr(getattr(e, "response", None), "status_code", None)
+
+
+# --- LIMITATORE A GETTONI (TOKEN BUCKET) ---
+# Ogni richiesta consuma un gettone; i gettoni si ricaricano a ritmo costante fino a capacity.
+# Senza gettoni acquire() aspetta (nel thread che chiama) invece di farsi rifiutare da Google.
+class TokenBucket:
+    def __init__(self, per_minute, capacity=QUOTA_BURST, window=QUOTA_WINDOW_SECONDS):
+        self.capacity = min(capacity, per_minute)
+        self.rate = (per_minute - self.capacity) / window or per_minute / window
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Restituisce i secondi passati ad aspettare il gettone
+    def acquire(self):
+        waited = 0.0
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+                time.sleep(wait)
+                waited += wait
+
+
+# --- POOL CONDIVISO DI CONNESSIONE A GOOGLE SHEETS ---
+# Un'unica istanza per processo (vedi get_sheet_pool in torneo_cloud.py): client autorizzato,
+# spreadsheet aperto e handle dei fogli vengono riusati tra sessioni e rerun, così un salvataggio
+# costa una sola chiamata HTTP invece di autorizzazione + apertura + scrittura.
+# gspread e oauth2client si importano solo alla prima autorizzazione: creare il pool non costa nulla.
+# client_factory: alternativa all'autorizzazione con le credenziali (es. fake_sheets.FakeClient).
+class SheetPool:
+    def __init__(self, creds_dict, sheet_url, client_factory=None,
+                 read_quota=READ_QUOTA_PER_MINUTE, write_quota=WRITE_QUOTA_PER_MINUTE,
+                 window=QUOTA_WINDOW_SECONDS):
+        self.creds_dict = creds_dict
+        self.sheet_url = sheet_url
+        self.client_factory = client_factory
+        self._lock = threading.RLock()
+        self._creds = None
+        self._client = None
+        self._spreadsheet = None
+        self._worksheets = {}
+        self.quota = {"read": read_quota, "write": write_quota}
+        self.window = window
+        self._buckets = {kind: TokenBucket(q, window=window) for kind, q in self.quota.items()}
+        self._recent = {"read": deque(), "write": deque()}
+        self._recent_lock = threading.Lock()
+        self.max_retries = MAX_RETRIES
+        self.backoff_base = BACKOFF_BASE
+        self.backoff_max = BACKOFF_MAX
+        self.stats = {
+            "authorizations": 0, "auth_avoided": 0,
+            "opens": 0, "open_avoided": 0,
+            "token_refreshes": 0, "reconnects": 0, "errors": 0,
+            "requests": 0, "throttled": 0, "throttled_ms": 0.0, "retries": 0, "quota_errors": 0,
+        }
+
+    def _authorize(self):
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+        self._creds = ServiceAccountCredentials.from_json_keyfile_dict(self.creds_dict, SCOPE)
+        return gspread.authorize(self._creds)
+
+    def _get_client(self):
+        if self._client is None:
+            with profiler.phase("Sheets: autorizzazione"):
+                self._client = (self.client_factory or self._authorize)()
+            self.stats["authorizations"] += 1
+        else:
+            self.stats["auth_avoided"] += 1
+            # Con gspread >= 5 il rinnovo del token è automatico; con le versioni che usano
+            # direttamente oauth2client lo rinnoviamo noi prima che scada.
+            if getattr(self._creds, "access_token_expired", False) and hasattr(self._client, "login"):
+                self._client.login()
+                self.stats["token_refreshes"] += 1
+        return self._client
+
+    def _get_spreadsheet(self):
+        client = self._get_client()
+        if self._spreadsheet is None:
+            with profiler.phase("Sheets: apertura foglio"):
+                self._spreadsheet = client.open_by_url(self.sheet_url)
+            self.stats["opens"] += 1
+        else:
+            self.stats["open_avoided"] += 1
+        return self._spreadsheet
+
+    def spreadsheet(self):
+        with self._lock:
+            return self._get_spreadsheet()
+
+    # create=(righe, colonne): se il foglio non esiste lo crea con queste dimensioni
+    def worksheet(self, title=None, create=None):
+        with self._lock:
+            if title in self._worksheets:
+                self.stats["auth_avoided"] += 1
+                self.stats["open_avoided"] += 1
+                return self._worksheets[title]
+            spreadsheet = self._get_spreadsheet()
+            from gspread.exceptions import WorksheetNotFound
+            if title is None:
+                ws = spreadsheet.sheet1
+            else:
+                try:
+                    ws = spreadsheet.worksheet(title)
+                except WorksheetNotFound:
+                    if create is None:
+                        raise
+                    ws = spreadsheet.add_worksheet(title, rows=create[0], cols=create[1])
+            self._worksheets[title] = ws
+            return ws
+
+    def reset(self):
+        with self._lock:
+            self._creds = None
+            self._client = None
+            self._spreadsheet = None
+            self._worksheets = {}
+
+    # Esegue fn(worksheet) rispettando la quota e riprovando sugli errori temporanei.
+    # kind: "read" | "write" (Google conta separatamente letture e scritture).
+    # idempotent: ripetere la richiesta dà lo stesso risultato (es. scrivere valori in celle fisse);
+    # se False si riprova solo quando Google l'ha sicuramente rifiutata (429), non dopo un errore
+    # di rete o un 5xx, che potrebbero essere arrivati dopo averla già applicata.
+    def call(self, fn, title=None, kind="read", idempotent=True):
+        return self._with_reconnect(lambda: fn(self.worksheet(title)), kind, idempotent)
+
+    # Come call, ma fn riceve lo spreadsheet (per letture/scritture batch su più fogli)
+    def call_spreadsheet(self, fn, kind="read", idempotent=True):
+        return self._with_reconnect(lambda: fn(self.spreadsheet()), kind, idempotent)
+
+    def _with_reconnect(self, op, kind="read", idempotent=True):
+        attempt = 0
+        while True:
+            self._throttle(kind)
+            profiler.count("Richieste Sheets")
+            try:
+                return op()
+            except Exception as e:
+                status = error_status(e)
+                self.stats["errors"] += 1
+                if status == 429:
+                    self.stats["quota_errors"] += 1
+                transient = status == 429 or (idempotent and (status is None or status >= 500))
+                # Connessione caduta o token revocato: si ricreano client e handle
+                if status in (None, 401):
+                    self.reset()
+                    self.stats["reconnects"] += 1
+                if attempt >= self.max_retries or not (transient or (status == 401 and attempt == 0)):
+                    raise
+                if transient:
+                    delay = min(self.backoff_base * (2 ** attempt + random.random()), self.backoff_max)
+                    with profiler.phase("Sheets: attesa dopo errore"):
+                        time.sleep(delay)
+                attempt += 1
+                self.stats["retries"] += 1
+                profiler.count("Tentativi Sheets")
+
+    def _throttle(self, kind):
+        waited = self._buckets[kind].acquire()
+        now = time.monotonic()
+        with self._recent_lock:
+            recent = self._recent[kind]
+            recent.append(now)
+            while recent[0] <= now - self.window:
+                recent.popleft()
+            self.stats["requests"] += 1
+            if waited:
+                self.stats["throttled"] += 1
+                self.stats["throttled_ms"] += waited * 1000
+        if waited:
+            profiler.count("Attesa quota (ms)", round(waited * 1000, 1))
+
+    # Richieste partite nell'ultimo minuto rispetto alla quota: {"read": (usate, quota), "write": ...}
+    def usage(self):
+        now = time.monotonic()
+        with self._recent_lock:
+            return {kind: (sum(1 for t in recent if t > now - self.window), self.quota[kind])
+                    for kind, recent in self._recent.items()}
+
+    def health_check(self):
+        start = time.perf_counter()
+        try:
+            self._throttle("read")
+            with self._lock:
+                self._get_spreadsheet().fetch_sheet_metadata()
+            return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.reset()
+            return {"ok": False, "latency_ms": round((time.perf_counter() - start) * 1000, 1), "error": str(e)}
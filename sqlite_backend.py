@@ -0,0 +1,262 @@
+import json
+import sqlite3
+import threading
+
+import profiler
+from rules import DEFAULT_RULES
+from scoring import RACES
+from migrations import SCHEMA_VERSION, migrate
+from storage import StorageBackend
+
+# --- BACKEND SQLITE ---
+# Tabelle normalizzate (una riga per giornata/gara/giocatore) con indici su giocatore e giornata:
+# classifica e statistiche per giocatore diventano query aggregate invece di cicli su tutto lo storico.
+# Si salvano piazzamenti e posizioni (schema 4, vedi migrations.py): i punti li calcolano le query,
+# generate dal regolamento. I database creati prima hanno i punti in race_results/skill_results:
+# load() li legge da lì e il VersionedLoader migra e riscrive nelle tabelle nuove.
+SQLITE_FILE = "campionato.db"
+SKILL_FIELDS = ("basket", "darts", "basket_bonus", "darts_bonus")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS giornate (
+    num INTEGER PRIMARY KEY,
+    extra TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS race_placings (
+    giornata INTEGER NOT NULL REFERENCES giornate(num) ON DELETE CASCADE,
+    race INTEGER NOT NULL,
+    player INTEGER NOT NULL,
+    placing INTEGER NOT NULL,
+    PRIMARY KEY (giornata, race, player)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS skill_placings (
+    giornata INTEGER NOT NULL REFERENCES giornate(num) ON DELETE CASCADE,
+    player INTEGER NOT NULL,
+    basket INTEGER NOT NULL,
+    darts INTEGER NOT NULL,
+    basket_bonus INTEGER NOT NULL,
+    darts_bonus INTEGER NOT NULL,
+    PRIMARY KEY (giornata, player)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS absences (
+    giornata INTEGER NOT NULL REFERENCES giornate(num) ON DELETE CASCADE,
+    player INTEGER NOT NULL,
+    PRIMARY KEY (giornata, player)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_race_placings_player ON race_placings (player, giornata);
+CREATE INDEX IF NOT EXISTS idx_skill_placings_player ON skill_placings (player, giornata);
+CREATE INDEX IF NOT EXISTS idx_absences_player ON absences (player, giornata);
+"""
+
+# Punteggio di giornata per giocatore presente, con le stesse regole di scoring.compute_day:
+# le tabelle del regolamento diventano CASE sul piazzamento
+DAY_TOTALS_SQL = """
+WITH day AS (
+    SELECT r.giornata, r.player, SUM({race_points}) AS mk8, SUM(r.placing = 1) AS wins
+    FROM race_placings r
+    WHERE NOT EXISTS (SELECT 1 FROM absences a WHERE a.giornata = r.giornata AND a.player = r.player)
+    {where}
+    GROUP BY r.giornata, r.player
+)
+SELECT d.giornata, d.player,
+       d.mk8 + {basket_points} + {darts_points}
+       + CASE WHEN d.wins = {n_races} THEN {grand_slam_bonus} ELSE 0 END
+       + CASE WHEN d.wins >= {five_wins_min} THEN {five_wins_bonus} ELSE 0 END AS total,
+       d.wins, {basket_points} AS basket, {darts_points} AS darts
+FROM day d JOIN skill_placings s ON s.giornata = d.giornata AND s.player = d.player
+"""
+
+
+def _points_case(column, table):
+    whens = " ".join(f"WHEN {place} THEN {points}" for place, points in enumerate(table) if place)
+    return f"(CASE {column} {whens} ELSE 0 END)"
+
+
+def day_totals_sql(rules, where=""):
+    skill = lambda field: f"({_points_case(f's.{field}', rules.skill_table)} + s.{field}_bonus * {rules.skill_bonus})"
+    return DAY_TOTALS_SQL.format(
+        race_points=_points_case("r.placing", rules.race_table), where=where,
+        basket_points=skill("basket"), darts_points=skill("darts"), n_races=len(RACES),
+        grand_slam_bonus=rules.grand_slam_bonus, five_wins_min=rules.five_wins_min,
+        five_wins_bonus=rules.five_wins_bonus)
+
+
+def _day_num(day_key):
+    return int(day_key.split(" ")[1])
+
+
+class SqliteBackend(StorageBackend):
+    name = "sqlite"
+    capabilities = {"version_probe": True, "write_behind": False, "queries": True, "history": False}
+
+    def __init__(self, path=SQLITE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+
+    def _meta_get(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _bump_version(self):
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('version', '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+    def load(self):
+        with self._lock, profiler.phase("SQLite: lettura"):
+            meta_raw = self._meta_get("data")
+            if meta_raw is None:
+                return None
+            data = json.loads(meta_raw)
+            n = len(data["config"]["players"])
+            giornate = {}
+            for num, extra in self._conn.execute("SELECT num, extra FROM giornate ORDER BY num"):
+                day = {"races": {r: [0] * n for r in RACES}, "absent": [False] * n,
+                       "basket": [0] * n, "darts": [0] * n,
+                       "basket_bonus": [False] * n, "darts_bonus": [False] * n}
+                if extra:
+                    day.update(json.loads(extra))
+                giornate[num] = day
+            if data.get("schema", 0) < SCHEMA_VERSION:
+                self._load_legacy(giornate)
+            else:
+                for g, race, player, placing in self._conn.execute(
+                        "SELECT giornata, race, player, placing FROM race_placings"):
+                    giornate[g]["races"][RACES[race]][player] = placing
+                for g, player, *values in self._conn.execute(
+                        f"SELECT giornata, player, {', '.join(SKILL_FIELDS)} FROM skill_placings"):
+                    for field, value in zip(SKILL_FIELDS, values):
+                        giornate[g][field][player] = bool(value) if field.endswith("_bonus") else value
+            for g, player in self._conn.execute("SELECT giornata, player FROM absences"):
+                giornate[g]["absent"][player] = True
+        data["giornate"] = {f"Giornata {num}": day for num, day in giornate.items()}
+        return data
+
+    # Database di prima dello schema 4: punti invece di piazzamenti (li converte migrate())
+    def _load_legacy(self, giornate):
+        for day in giornate.values():
+            del day["basket_bonus"], day["darts_bonus"]
+        for g, race, player, points in self._conn.execute(
+                "SELECT giornata, race, player, points FROM race_results"):
+            giornate[g]["races"][RACES[race]][player] = points
+        for g, player, basket, darts in self._conn.execute(
+                "SELECT giornata, player, basket, darts FROM skill_results"):
+            giornate[g]["basket"][player] = basket
+            giornate[g]["darts"][player] = darts
+
+    def _write_meta(self, data):
+        meta = json.dumps({k: v for k, v in data.items() if k != "giornate"})
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('data', ?)", (meta,))
+
+    def _write_day(self, num, day):
+        extra = {k: v for k, v in day.items() if k not in ("races", "absent") + SKILL_FIELDS}
+        self._conn.execute("INSERT OR REPLACE INTO giornate (num, extra) VALUES (?, ?)",
+                           (num, json.dumps(extra) if extra else ""))
+        for field in ("absent", "basket") + tuple(RACES):
+            self._write_field(num, day, field)
+
+    def _write_field(self, num, day, field):
+        if field in RACES:
+            race = RACES.index(field)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO race_placings (giornata, race, player, placing) VALUES (?, ?, ?, ?)",
+                [(num, race, p, placing) for p, placing in enumerate(day["races"][field])])
+        elif field in SKILL_FIELDS:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO skill_placings (giornata, player, {', '.join(SKILL_FIELDS)}) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(num, p) + tuple(int(day[f][p]) for f in SKILL_FIELDS) for p in range(len(day["basket"]))])
+        elif field == "absent":
+            self._conn.execute("DELETE FROM absences WHERE giornata = ?", (num,))
+            self._conn.executemany("INSERT INTO absences (giornata, player) VALUES (?, ?)",
+                                   [(num, p) for p, a in enumerate(day["absent"]) if a])
+
+    def save(self, data):
+        with self._lock, profiler.phase("SQLite: scrittura"):
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM giornate")
+                for day_key, day in data["giornate"].items():
+                    self._write_day(_day_num(day_key), day)
+                self._write_meta(data)
+                self._bump_version()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # Riscrive solo le righe dei campi toccati, in un'unica transazione
+    def update(self, data, dirty):
+        with self._lock, profiler.phase("SQLite: scrittura"):
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = {row[0] for row in self._conn.execute("SELECT num FROM giornate")}
+                for day_key, field in dirty:
+                    num, day = _day_num(day_key), data["giornate"][day_key]
+                    if num not in existing:
+                        self._write_day(num, day)
+                        existing.add(num)
+                    else:
+                        self._write_field(num, day, field)
+                self._write_meta(data)
+                self._bump_version()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def version(self):
+        with self._lock:
+            return self._meta_get("version")
+
+    # --- QUERY AGGREGATE ---
+    # Classifica generale calcolata dal database: {giocatore: {"Totale", "Presenze", "Media"}}
+    def standings(self, players, rules=DEFAULT_RULES):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT player, SUM(total), COUNT(*) FROM ({day_totals_sql(rules)}) GROUP BY player"
+            ).fetchall()
+        result = {p: {"Totale": 0, "Presenze": 0, "Media": 0.0} for p in players}
+        for player, total, presences in rows:
+            result[players[player]] = {"Totale": total, "Presenze": presences,
+                                       "Media": round(total / presences, 2) if presences else 0.0}
+        return result
+
+    # Punteggi di un giocatore giornata per giornata (solo presenze):
+    # [(numero giornata, punti, vittorie, punti basket, punti freccette)]
+    def player_history(self, player_idx, rules=DEFAULT_RULES):
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT giornata, total, wins, basket, darts FROM ({day_totals_sql(rules, 'AND r.player = ?')}) "
+                "ORDER BY giornata", (player_idx,)).fetchall()
+
+
+# --- IMPORTAZIONE DAL VECCHIO FORMATO ---
+# Uso: python sqlite_backend.py dati.json [campionato.db]
+# dati.json è il JSON che stava nella cella A1 (o il dati_campionato.json della versione locale).
+def import_json(json_path, db_path=SQLITE_FILE):
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    migrate(data)
+    backend = SqliteBackend(db_path)
+    backend.save(data)
+    return backend
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Uso: python sqlite_backend.py dati.json [campionato.db]")
+        sys.exit(1)
+    imported = import_json(*sys.argv[1:3])
+    print(f"✅ Importate {len(imported.load()['giornate'])} giornate in {imported.path}")
@@ -0,0 +1,65 @@
+from rules import data_rules
+from scoring import day_scores, reserve
+
+# --- CLASSIFICA GENERALE INCREMENTALE ---
+# I totali di ogni giocatore vengono salvati insieme ai dati (data["standings"]) e aggiornati
+# con la sola differenza della giornata modificata: disegnare la classifica costa O(giocatori)
+# indipendentemente dalla lunghezza del campionato.
+
+
+def empty_standings(players):
+    return {p: {"Totale": 0, "Presenze": 0, "Media": 0.0} for p in players}
+
+
+def _refresh_media(entry):
+    entry["Media"] = round(entry["Totale"] / entry["Presenze"], 2) if entry["Presenze"] > 0 else 0.0
+
+
+def compute_standings(data):
+    players = data["config"]["players"]
+    standings = empty_standings(players)
+    rules = data_rules(data)
+    reserve(len(data["giornate"]))
+    for day in data["giornate"].values():
+        apply_day_delta(standings, players, None, day_scores(day, rules))
+    return standings
+
+
+# old_scores / new_scores: day_scores della giornata prima e dopo la modifica
+# (None se la giornata non esisteva o è stata eliminata)
+def apply_day_delta(standings, players, old_scores, new_scores):
+    for i, p in enumerate(players):
+        old = old_scores[i] if old_scores is not None else None
+        new = new_scores[i] if new_scores is not None else None
+        if old is None and new is None:
+            continue
+        entry = standings[p]
+        entry["Totale"] += (new["total"] if new is not None else 0) - (old["total"] if old is not None else 0)
+        entry["Presenze"] += (new is not None) - (old is not None)
+        _refresh_media(entry)
+
+
+def update_standings(data, old_scores, new_scores):
+    apply_day_delta(data["standings"], data["config"]["players"], old_scores, new_scores)
+
+
+# Dati vecchi (o giocatori cambiati): la classifica si ricostruisce da zero una volta
+def ensure_standings(data):
+    if set(data.get("standings", {})) != set(data["config"]["players"]):
+        data["standings"] = compute_standings(data)
+        return True
+    return False
+
+
+# Confronta la classifica incrementale con un ricalcolo completo; restituisce i giocatori discordanti
+def verify_standings(data):
+    expected = compute_standings(data)
+    stored = data.get("standings", {})
+    return [p for p in expected if stored.get(p) != expected[p]]
+
+
+# Righe della classifica ordinate per MEDIA PUNTI e, a parità, per Totale Punti
+def ranking(data):
+    rows = [{"Giocatore": p, "PG": s["Presenze"], "Totale Punti": s["Totale"], "MEDIA PUNTI": s["Media"]}
+            for p, s in data["standings"].items()]
+    return sorted(rows, key=lambda r: (r["MEDIA PUNTI"], r["Totale Punti"]), reverse=True)
@@ -0,0 +1,216 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+import profiler
+from event_log import EventLogStore
+from migrations import SCHEMA_VERSION, migrate
+
+# --- BACKEND DI SALVATAGGIO ---
+# Interfaccia comune (load, save, update parziale, version) con implementazioni intercambiabili,
+# scelte da configurazione: file JSON locale (sviluppo, benchmark) o Google Sheets (produzione).
+# Ogni backend dichiara cosa sa fare, così l'app usa la scrittura più economica disponibile.
+LOCAL_FILE = "dati_campionato.json"
+
+
+def empty_data(players):
+    return {"schema": SCHEMA_VERSION, "config": {"players": list(players)}, "giornate": {}}
+
+
+class StorageBackend:
+    name = "base"
+    # version_probe: version() costa poco (una cella, uno stat); write_behind: scritture lente/remote,
+    # conviene accodarle in background; queries: calcola da sé classifica e storico
+    # (standings/player_history), che quindi non si tengono in memoria; history: tiene il registro
+    # delle modifiche (recent_events, chi ha cambiato cosa e quando)
+    capabilities = {"version_probe": False, "write_behind": False, "queries": False, "history": False}
+
+    # Restituisce il campionato salvato, o None se non c'è ancora nulla
+    def load(self):
+        raise NotImplementedError
+
+    def save(self, data):
+        raise NotImplementedError
+
+    # Scrittura parziale: dirty è una lista di (giornata, campo). Chi non la supporta salva tutto.
+    def update(self, data, dirty):
+        self.save(data)
+
+    # Token che cambia a ogni salvataggio (None se il backend non sa fornirlo)
+    def version(self):
+        return None
+
+    # Copia dei dati com'erano prima di una migrazione dello schema, se il backend sa farla
+    def backup(self):
+        return None
+
+
+class LocalJsonBackend(StorageBackend):
+    name = "local"
+    capabilities = {"version_probe": True, "write_behind": False, "queries": False, "history": False}
+
+    def __init__(self, path=LOCAL_FILE):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with profiler.phase("File: lettura"):
+            with open(self.path, "r") as f:
+                raw = f.read()
+        profiler.count("Byte letti", len(raw))
+        with profiler.phase("Deserializzazione"):
+            return json.loads(raw)
+
+    # Scrittura atomica: file temporaneo + rename, mai un file a metà
+    def save(self, data):
+        tmp_path = f"{self.path}.tmp"
+        with profiler.phase("File: scrittura"):
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=4)
+            os.replace(tmp_path, self.path)
+
+    # Il file di default è anche quello di torneo_v5New.py: prima che la migrazione lo riscriva nel
+    # formato nuovo se ne tiene una copia (.bak), solo la prima volta. Restituisce il percorso
+    def backup(self):
+        backup_path = f"{self.path}.bak"
+        if os.path.exists(self.path) and not os.path.exists(backup_path):
+            shutil.copy2(self.path, backup_path)
+        return backup_path
+
+    def version(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+# Su Sheets ogni salvataggio è un evento in coda al registro (vedi event_log.py)
+class SheetsBackend(EventLogStore, StorageBackend):
+    name = "sheets"
+    capabilities = {"version_probe": True, "write_behind": True, "queries": False, "history": True}
+
+    def load(self):
+        data = super().load()
+        if data is None:
+            # Migrazione una tantum dal vecchio formato (tutto il JSON in A1 del primo foglio)
+            raw_data = self.pool.call(lambda sheet: sheet.acell('A1').value)
+            if not raw_data:
+                return None
+            data = json.loads(raw_data)
+            migrate(data)
+            self.save(data)
+        return data
+
+    def save(self, data):
+        EventLogStore.save(self, data)
+
+    def version(self):
+        return EventLogStore.version(self)
+
+    def update(self, data, dirty):
+        EventLogStore.save(self, data, dirty)
+
+
+# --- CARICAMENTO CON VERSIONE ---
+# Prima di scaricare tutto il campionato si legge solo la versione: se è quella già in memoria
+# si riusa la copia analizzata l'ultima volta. La copia è un'istantanea condivisa da tutte le
+# sessioni del processo (una sola in memoria per versione, non una per spettatore): chi la riceve
+# non deve modificarla, chi deve scrivere se ne fa una copia propria (copy-on-write).
+# Dati con uno schema vecchio (vedi migrations.py) vengono aggiornati e riscritti subito, una volta sola.
+# prepare(data, previous): completamento eseguito una volta sola su ogni versione scaricata (es.
+# classifica); previous è l'ultima versione scaricata prima (None la prima volta), da non modificare
+# on_load(version, data): notifica di ogni nuova versione scaricata (es. copia locale su disco)
+class VersionedLoader:
+    def __init__(self, backend, prepare=None, on_load=None):
+        self.backend = backend
+        self.prepare = prepare
+        self.on_load = on_load
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = None
+        # Ultima versione scaricata, anche dopo invalidate: prepare può partire da lì
+        self._last = None
+        self._probed = None
+        self._probed_at = float("-inf")
+        self.stats = {"hits": 0, "misses": 0, "probes": 0, "invalidations": 0, "migrations": 0}
+
+    # Versione attuale sul backend; con max_age > 0 una lettura recente viene condivisa
+    # tra tutte le sessioni (molti spettatori in diretta = una sola lettura ogni max_age secondi)
+    def probe(self, max_age=0.0):
+        if not self.backend.capabilities["version_probe"]:
+            return None
+        with self._lock:
+            if time.monotonic() - self._probed_at < max_age:
+                return self._probed
+        version = self.backend.version()
+        with self._lock:
+            self._probed, self._probed_at = version, time.monotonic()
+            self.stats["probes"] += 1
+        return version
+
+    # Restituisce (versione, dati condivisi); version: versione già letta con probe, per non rileggerla
+    def load_versioned(self, version=None):
+        if version is None:
+            version = self.probe()
+        with self._lock:
+            if version is not None and version == self._version:
+                self.stats["hits"] += 1
+                profiler.count("Download evitati")
+                return version, self._data
+        data = self.backend.load()
+        migrated = data is not None and migrate(data)
+        if data is not None and self.prepare is not None:
+            with self._lock:
+                previous = self._last
+            self.prepare(data, previous)
+        if migrated:
+            # Si salva anche il completamento di prepare, che altrimenti si rifarebbe a ogni caricamento
+            with profiler.phase("Migrazione schema"):
+                self.backend.backup()
+                self.backend.save(data)
+            version = self.backend.version()
+            self.stats["migrations"] += 1
+        with self._lock:
+            self.stats["misses"] += 1
+            if data is not None:
+                # Versione letta prima del download: se nel frattempo qualcuno ha salvato,
+                # al prossimo controllo risulterà diversa e si riscaricherà
+                self._version, self._data, self._last = version, data, data
+        if data is not None and self.on_load is not None:
+            self.on_load(version, data)
+        return version, data
+
+    # Versione dell'istantanea in memoria (None se non è ancora stato scaricato nulla)
+    def cached_version(self):
+        with self._lock:
+            return self._version
+
+    # Dopo un salvataggio l'istantanea non è più quella giusta: la prossima lettura riscarica
+    def invalidate(self):
+        with self._lock:
+            self._version, self._data = None, None
+            self._probed_at = float("-inf")
+            self.stats["invalidations"] += 1
+
+    def load(self):
+        return self.load_versioned()[1]
+
+
+# settings: sezione [storage] dei secrets (backend = "sheets" | "local" | "sqlite", path = ...);
+# le variabili d'ambiente TORNEO_STORAGE_BACKEND e TORNEO_STORAGE_PATH hanno la precedenza
+# (comodo per sviluppo e benchmark).
+# pool_factory crea il SheetPool solo se serve davvero.
+def open_backend(settings, pool_factory):
+    kind = os.environ.get("TORNEO_STORAGE_BACKEND", settings.get("backend", "sheets"))
+    if kind == "local":
+        return LocalJsonBackend(os.environ.get("TORNEO_STORAGE_PATH", settings.get("path", LOCAL_FILE)))
+    if kind == "sqlite":
+        from sqlite_backend import SqliteBackend, SQLITE_FILE
+        return SqliteBackend(os.environ.get("TORNEO_STORAGE_PATH", settings.get("path", SQLITE_FILE)))
+    if kind == "sheets":
+        return SheetsBackend(pool_factory())
+    raise ValueError(f"Backend di salvataggio sconosciuto: {kind}")
@@ -0,0 +1,83 @@
+import json
+import random
+
+from migrations import SCHEMA_VERSION
+from scoring import RACES
+
+# --- CAMPIONATI SINTETICI ---
+# Genera campionati realistici di qualsiasi durata, per benchmark e prove in locale.
+# Ogni giocatore ha una "forza" per le gare e per le skill: i piazzamenti si estraggono in ordine,
+# pesati per forza, tra i soli presenti (come in una serata vera con un assente: 1°-2°-3° posto).
+# Uso: python synthetic.py numero_giornate [file.json]
+PLAYERS = ["Infame", "Cammellaccio", "Pierino", "Nicolino"]
+
+
+# Ordine d'arrivo estratto senza reinserimento, con probabilità proporzionale alla forza
+def _placing(rnd, indices, strengths):
+    remaining, order = list(indices), []
+    while remaining:
+        pick = rnd.choices(remaining, weights=[strengths[i] for i in remaining])[0]
+        remaining.remove(pick)
+        order.append(pick)
+    return order
+
+
+# Posizioni (1-4, 0 per gli assenti) e bonus di una skill
+def _skill_ranks(rnd, present, strengths, bonus_rate, n_players):
+    ranks, bonus = [0] * n_players, [False] * n_players
+    for rank, i in enumerate(_placing(rnd, present, strengths)):
+        ranks[i] = rank + 1
+        bonus[i] = rnd.random() < bonus_rate
+    return ranks, bonus
+
+
+# absence_rate: probabilità che un giocatore salti una giornata (almeno due restano presenti)
+# race_strength / skill_strength: forza relativa per giocatore (default: tutti uguali)
+# basket_bonus_rate / darts_bonus_rate: probabilità del +5 (>= 20 punti, <= 3 round)
+# grand_slam_rate: probabilità che in una giornata un presente vinca tutte e 12 le gare
+def generate(n_days, players=None, absence_rate=0.1, race_strength=None, skill_strength=None,
+             basket_bonus_rate=0.3, darts_bonus_rate=0.2, grand_slam_rate=0.01, seed=42):
+    players = list(players or PLAYERS)
+    n = len(players)
+    rnd = random.Random(seed)
+    race_strength = race_strength or [1.0] * n
+    skill_strength = skill_strength or [1.0] * n
+    giornate = {}
+    for g in range(n_days):
+        absent = [rnd.random() < absence_rate for _ in players]
+        while n - sum(absent) < min(2, n):
+            absent[rnd.randrange(n)] = False
+        present = [i for i in range(n) if not absent[i]]
+
+        grand_slam = rnd.choice(present) if rnd.random() < grand_slam_rate else None
+        races = {}
+        for r in RACES:
+            order = _placing(rnd, present, race_strength)
+            if grand_slam is not None:
+                order.remove(grand_slam)
+                order.insert(0, grand_slam)
+            placings = [0] * n
+            for rank, i in enumerate(order):
+                placings[i] = rank + 1
+            races[r] = placings
+
+        basket, basket_bonus = _skill_ranks(rnd, present, skill_strength, basket_bonus_rate, n)
+        darts, darts_bonus = _skill_ranks(rnd, present, skill_strength, darts_bonus_rate, n)
+        giornate[f"Giornata {g + 1}"] = {
+            "races": races, "basket": basket, "darts": darts,
+            "basket_bonus": basket_bonus, "darts_bonus": darts_bonus,
+            "absent": absent,
+        }
+    return {"schema": SCHEMA_VERSION, "config": {"players": players}, "giornate": giornate}
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Uso: python synthetic.py numero_giornate [file.json]")
+        sys.exit(1)
+    out_path = sys.argv[2] if len(sys.argv) > 2 else "campionato_sintetico.json"
+    with open(out_path, "w") as f:
+        json.dump(generate(int(sys.argv[1])), f)
+    print(f"✅ Generate {sys.argv[1]} giornate in {out_path}")
@@ -0,0 +1,211 @@
+import numpy as np
+
+from rules import DEFAULT_RULES
+from scoring import RACES
+from timeline import FORM_WINDOW
+
+# --- RAPPRESENTAZIONE VETTORIALE DEL CAMPIONATO ---
+# Tutte le giornate in array compatti: races (piazzamenti, giornate x gare x giocatori), absent,
+# basket/darts (posizioni) e i loro bonus (giornate x giocatori). I punti si ottengono indicizzando
+# le tabelle del regolamento (rules.py) con i piazzamenti: i calcoli della classifica sono operazioni
+# NumPy invece di cicli Python, e cambiare regolamento non tocca gli array.
+SKILL_FIELDS = ("basket", "darts", "basket_bonus", "darts_bonus")
+
+
+def _day_num(day_key):
+    return int(day_key.split(" ")[1])
+
+
+# Gli array sono un'istantanea immutabile: ogni grandezza derivata si calcola una volta sola
+# per regolamento
+def _memo(fn):
+    def wrapper(self, rules=DEFAULT_RULES):
+        key = (fn.__name__, rules.key)
+        if key not in self._memo:
+            self._memo[key] = fn(self, rules)
+        return self._memo[key]
+    return wrapper
+
+
+class ChampionshipTensor:
+    def __init__(self, days, players, races, absent, basket, darts, basket_bonus, darts_bonus,
+                 extras=None, meta=None):
+        self.days = days
+        self.players = players
+        self.races = races
+        self.absent = absent
+        self.basket = basket
+        self.darts = darts
+        self.basket_bonus = basket_bonus
+        self.darts_bonus = darts_bonus
+        # Campi non numerici o non gestiti (es. "ko" del formato locale), per un round-trip senza perdite
+        self.extras = extras if extras is not None else [{} for _ in days]
+        self.meta = meta if meta is not None else {}
+        self._memo = {}
+
+    @classmethod
+    def from_data(cls, data):
+        players = data["config"]["players"]
+        days = sorted(data["giornate"].keys(), key=_day_num)
+        n_days, n_players = len(days), len(players)
+        races = np.zeros((n_days, len(RACES), n_players), dtype=np.int8)
+        absent = np.zeros((n_days, n_players), dtype=bool)
+        basket = np.zeros((n_days, n_players), dtype=np.int8)
+        darts = np.zeros((n_days, n_players), dtype=np.int8)
+        basket_bonus = np.zeros((n_days, n_players), dtype=bool)
+        darts_bonus = np.zeros((n_days, n_players), dtype=bool)
+        extras = []
+        for g, day_key in enumerate(days):
+            day = data["giornate"][day_key]
+            races[g] = [day["races"][r] for r in RACES]
+            absent[g] = day["absent"]
+            basket[g] = day["basket"]
+            darts[g] = day["darts"]
+            basket_bonus[g] = day["basket_bonus"]
+            darts_bonus[g] = day["darts_bonus"]
+            extras.append({k: v for k, v in day.items() if k not in ("races", "absent") + SKILL_FIELDS})
+        meta = {k: v for k, v in data.items() if k != "giornate"}
+        return cls(days, players, races, absent, basket, darts, basket_bonus, darts_bonus, extras, meta)
+
+    def to_data(self):
+        data = dict(self.meta)
+        data["giornate"] = {}
+        for g, day_key in enumerate(self.days):
+            day = {
+                "races": {r: self.races[g, k].tolist() for k, r in enumerate(RACES)},
+                "basket": self.basket[g].tolist(), "darts": self.darts[g].tolist(),
+                "basket_bonus": self.basket_bonus[g].tolist(), "darts_bonus": self.darts_bonus[g].tolist(),
+                "absent": self.absent[g].tolist(),
+            }
+            day.update(self.extras[g])
+            data["giornate"][day_key] = day
+        return data
+
+    # --- CALCOLI VETTORIALI (giornate x giocatori; 0 per gli assenti) ---
+    def present(self):
+        return ~self.absent
+
+    def wins(self):
+        return (self.races == 1).sum(axis=1, dtype=np.int32) * self.present()
+
+    @_memo
+    def mk8(self, rules):
+        race_table = np.array(rules.race_table, dtype=np.int32)
+        return race_table[self.races].sum(axis=1) * self.present()
+
+    @_memo
+    def skills(self, rules):
+        skill_table = np.array(rules.skill_table, dtype=np.int32)
+        basket = skill_table[self.basket] + self.basket_bonus * rules.skill_bonus
+        darts = skill_table[self.darts] + self.darts_bonus * rules.skill_bonus
+        return basket * self.present(), darts * self.present()
+
+    @_memo
+    def bonuses(self, rules):
+        wins = self.wins()
+        grand_slam = np.where(wins == len(RACES), rules.grand_slam_bonus, 0)
+        five_wins = np.where(wins >= rules.five_wins_min, rules.five_wins_bonus, 0)
+        return grand_slam, five_wins
+
+    @_memo
+    def day_totals(self, rules):
+        grand_slam, five_wins = self.bonuses(rules)
+        basket, darts = self.skills(rules)
+        return (self.mk8(rules) + basket + darts + grand_slam + five_wins) * self.present()
+
+    @_memo
+    def standings(self, rules):
+        totals = self.day_totals(rules).sum(axis=0)
+        presences = self.present().sum(axis=0)
+        media = np.divide(totals, presences, out=np.zeros(len(self.players)), where=presences > 0)
+        return totals, presences, np.round(media, 2)
+
+    # Media cumulativa dopo ogni giornata (come "La Scalata": gli assenti mantengono la media precedente)
+    @_memo
+    def cumulative_average(self, rules):
+        cum_points = self.day_totals(rules).cumsum(axis=0)
+        cum_games = self.present().cumsum(axis=0)
+        return np.divide(cum_points, cum_games, out=np.zeros(cum_points.shape), where=cum_games > 0)
+
+    # Percentuali del radar per giocatore: vittorie, canestri, freccette (giocatori x 3)
+    @_memo
+    def radar_percentages(self, rules):
+        presences = self.present().sum(axis=0)
+        basket, darts = self.skills(rules)
+        actual = np.stack([
+            self.wins().sum(axis=0), basket.sum(axis=0), darts.sum(axis=0),
+        ], axis=1).astype(float)
+        maximum = np.stack([presences * len(RACES), presences * rules.skill_max,
+                            presences * rules.skill_max], axis=1)
+        return np.divide(actual * 100, maximum, out=np.zeros(actual.shape), where=maximum > 0)
+
+    # --- CLASSIFICA E STORICO NEL FORMATO DEI DATI ---
+    # Come standings.compute_standings e timeline.compute_timeline (stessi valori, stessi arrotondamenti),
+    # per ricalcolare tutto lo storico quando cambia il regolamento. Le medie si arrotondano in Python
+    # come fanno gli aggiornamenti incrementali, che poi continuano da questi valori
+    def standings_table(self, rules):
+        totals, presences, _ = self.standings(rules)
+        return {p: {"Totale": int(t), "Presenze": int(n), "Media": round(int(t) / int(n), 2) if n > 0 else 0.0}
+                for p, t, n in zip(self.players, totals.tolist(), presences.tolist())}
+
+    def timeline(self, rules):
+        day_totals, present = self.day_totals(rules), self.present()
+        cum_totals, cum_games = day_totals.cumsum(axis=0), present.cumsum(axis=0)
+        basket, darts = self.skills(rules)
+        wins = self.wins()
+        timeline = {}
+        for i, p in enumerate(self.players):
+            scores = [s if here else None for s, here in zip(day_totals[:, i].tolist(), present[:, i].tolist())]
+            # Forma dopo ogni presenza: media delle ultime FORM_WINDOW presenze
+            played = day_totals[present[:, i], i].tolist()
+            running, forms = 0, []
+            for j, s in enumerate(played):
+                running += s - (played[j - FORM_WINDOW] if j >= FORM_WINDOW else 0)
+                forms.append(round(running / min(j + 1, FORM_WINDOW), 2))
+            games = cum_games[:, i].tolist()
+            totals = cum_totals[:, i].tolist()
+            timeline[p] = {
+                "score": scores, "cum_total": totals, "cum_games": games,
+                "avg": [round(t / g, 2) if g > 0 else 0 for t, g in zip(totals, games)],
+                "form": [forms[g - 1] if g > 0 else None for g in games],
+                "totals": {"wins": int(wins[:, i].sum()), "basket": int(basket[:, i].sum()),
+                           "darts": int(darts[:, i].sum())},
+            }
+        return timeline
+
+    # --- MOLTI REGOLAMENTI INSIEME ---
+    # Il punteggio è lineare nei conteggi: quante volte ogni giocatore (presente) ha fatto ogni
+    # piazzamento, ogni posizione a basket e freccette, quanti bonus skill e quante giornate con
+    # k vittorie. I conteggi si calcolano una volta sola; i totali di K regolamenti sono poi un
+    # prodotto matrice (K x piazzamenti) per (piazzamenti x giocatori), qualunque sia lo storico.
+    def score_counts(self):
+        if "score_counts" not in self._memo:
+            present = self.present()
+            places = np.arange(len(DEFAULT_RULES.race_table))
+            races = (self.races[..., None] == places) & present[:, None, :, None]
+            skills = ((self.basket[..., None] == places) & present[..., None]).sum(axis=0) \
+                + ((self.darts[..., None] == places) & present[..., None]).sum(axis=0)
+            bonus = (self.basket_bonus & present).sum(axis=0) + (self.darts_bonus & present).sum(axis=0)
+            wins = self.wins()
+            wins_hist = ((wins[..., None] == np.arange(len(RACES) + 1)) & present[..., None]).sum(axis=0)
+            # days_with_at_least[p, m]: giornate (da presente) con almeno m vittorie
+            at_least = np.concatenate([wins_hist[:, ::-1].cumsum(axis=1)[:, ::-1],
+                                       np.zeros((len(self.players), 1), dtype=wins_hist.dtype)], axis=1)
+            self._memo["score_counts"] = {
+                "races": races.sum(axis=(0, 1)), "skills": skills, "skill_bonus": bonus,
+                "grand_slam": wins_hist[:, len(RACES)], "wins_at_least": at_least,
+            }
+        return self._memo["score_counts"]
+
+    # Totali per regolamento e giocatore (K x giocatori) per una lista di regolamenti compilati
+    def sweep_totals(self, rules_list):
+        counts = self.score_counts()
+        race_tables = np.array([r.race_table for r in rules_list], dtype=np.int64)
+        skill_tables = np.array([r.skill_table for r in rules_list], dtype=np.int64)
+        column = lambda attr: np.array([getattr(r, attr) for r in rules_list], dtype=np.int64)[:, None]
+        five_wins_min = np.clip([r.five_wins_min for r in rules_list], 0, len(RACES) + 1)
+        return (race_tables @ counts["races"].T
+                + skill_tables @ counts["skills"].T
+                + column("skill_bonus") * counts["skill_bonus"]
+                + column("grand_slam_bonus") * counts["grand_slam"]
+                + column("five_wins_bonus") * counts["wins_at_least"][:, five_wins_min].T)
@@ -0,0 +1,129 @@
+from rules import data_rules
+from scoring import day_scores, reserve
+
+# --- STORICO CUMULATIVO PER GIOCATORE ---
+# Per ogni giocatore, una colonna per grandezza con un valore per giornata (in ordine di giornata):
+# punteggio del giorno (None se assente), totale e presenze cumulati, media cumulativa e forma
+# (media delle ultime FORM_WINDOW presenze). Salvato con i dati (data["timeline"]) e aggiornato
+# solo dalla giornata modificata in poi: aggiungere o correggere l'ultima giornata costa O(giocatori).
+# "totals" tiene le somme di vittorie, basket e freccette per il radar delle statistiche.
+FORM_WINDOW = 3
+COLUMNS = ("score", "cum_total", "cum_games", "avg", "form")
+
+
+def _day_num(day_key):
+    return int(day_key.split(" ")[1])
+
+
+def empty_timeline(players):
+    return {p: {**{c: [] for c in COLUMNS}, "totals": {"wins": 0, "basket": 0, "darts": 0}} for p in players}
+
+
+def compute_timeline(data):
+    players = data["config"]["players"]
+    timeline = empty_timeline(players)
+    rules = data_rules(data)
+    reserve(len(data["giornate"]))
+    for day_key in sorted(data["giornate"].keys(), key=_day_num):
+        scores = day_scores(data["giornate"][day_key], rules)
+        for i, p in enumerate(players):
+            timeline[p]["score"].append(scores[i]["total"] if scores[i] is not None else None)
+            _apply_totals(timeline[p]["totals"], None, scores[i])
+    for p in players:
+        _recompute_from(timeline[p], 0)
+    return timeline
+
+
+def _apply_totals(totals, old, new):
+    for key in totals:
+        totals[key] += (new[key] if new is not None else 0) - (old[key] if old is not None else 0)
+
+
+# Media delle ultime FORM_WINDOW presenze fino alla posizione pos compresa (None se nessuna)
+def _form_at(score, pos):
+    last = []
+    while pos >= 0 and len(last) < FORM_WINDOW:
+        if score[pos] is not None:
+            last.append(score[pos])
+        pos -= 1
+    return round(sum(last) / len(last), 2) if last else None
+
+
+# Ricalcola le colonne cumulative di un giocatore dalla posizione start in poi
+def _recompute_from(column, start):
+    score = column["score"]
+    for c in COLUMNS[1:]:
+        del column[c][start:]
+    cum_total = column["cum_total"][-1] if start > 0 else 0
+    cum_games = column["cum_games"][-1] if start > 0 else 0
+    for pos in range(start, len(score)):
+        if score[pos] is not None:
+            cum_total += score[pos]
+            cum_games += 1
+        column["cum_total"].append(cum_total)
+        column["cum_games"].append(cum_games)
+        column["avg"].append(round(cum_total / cum_games, 2) if cum_games > 0 else 0)
+        column["form"].append(_form_at(score, pos))
+
+
+# old_scores / new_scores: day_scores della giornata prima e dopo la modifica (None se la giornata
+# non esisteva o è stata eliminata). Va chiamata con day_key ancora presente in data["giornate"].
+def update_timeline(data, day_key, old_scores, new_scores):
+    num = _day_num(day_key)
+    pos = sum(1 for k in data["giornate"] if _day_num(k) < num)
+    for i, p in enumerate(data["config"]["players"]):
+        column = data["timeline"][p]
+        old = old_scores[i] if old_scores is not None else None
+        new = new_scores[i] if new_scores is not None else None
+        if new_scores is None:
+            del column["score"][pos]
+        elif old_scores is None:
+            column["score"].insert(pos, new["total"] if new is not None else None)
+        else:
+            column["score"][pos] = new["total"] if new is not None else None
+        _apply_totals(column["totals"], old, new)
+        _recompute_from(column, pos)
+
+
+# Copia indipendente di uno storico (es. quello dell'istantanea condivisa, da non modificare)
+def copy_timeline(timeline):
+    return {p: {**{c: list(column[c]) for c in COLUMNS}, "totals": dict(column["totals"])}
+            for p, column in timeline.items()}
+
+
+# Dati vecchi (senza storico, giocatori cambiati o giornate non allineate): si ricostruisce una volta
+def ensure_timeline(data):
+    timeline = data.get("timeline", {})
+    players = data["config"]["players"]
+    if set(timeline) != set(players) or any(len(timeline[p]["score"]) != len(data["giornate"]) for p in players):
+        data["timeline"] = compute_timeline(data)
+        return True
+    return False
+
+
+# Forma attuale e variazione rispetto alla forma prima dell'ultima presenza (come "Forma Attuale")
+def current_form(column):
+    score, form = column["score"], column["form"]
+    last = len(score) - 1
+    while last >= 0 and score[last] is None:
+        last -= 1
+    if last < 0:
+        return 0, 0
+    prev = form[last - 1] if last > 0 else None
+    return form[last], (form[last] - prev) if prev is not None else 0
+
+
+# Storico da punteggi già calcolati dal database (vedi SqliteBackend.player_history).
+# day_nums: numeri delle giornate in ordine; histories: {giocatore: [(giornata, punti, vittorie,
+# basket, freccette)]} delle sole presenze
+def timeline_from_history(players, day_nums, histories):
+    timeline = empty_timeline(players)
+    pos = {num: i for i, num in enumerate(day_nums)}
+    for p in players:
+        column = timeline[p]
+        column["score"] = [None] * len(day_nums)
+        for num, total, wins, basket, darts in histories[p]:
+            column["score"][pos[num]] = total
+            _apply_totals(column["totals"], None, {"wins": wins, "basket": basket, "darts": darts})
+        _recompute_from(column, 0)
+    return timeline
@@ -1,70 +1,414 @@
+import copy
+import functools
+import time
+import uuid
+from collections import deque
+
 import streamlit as st
-import pandas as pd
-import json
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-import plotly.express as px
-import plotly.graph_objects as go
+from sheets import SheetPool
+from storage import open_backend, empty_data, VersionedLoader
+from delta_store import FIELDS as DAY_FIELDS
+from event_log import describe_event, undoable_events
+from write_behind import WriteBehindQueue
+from offline import OfflineStore, SNAPSHOT_FILE, JOURNAL_FILE
+import profiler
+from figure_cache import FigureCache
+from rules import PRESETS, data_rules, ruleset_key
+from scoring import RACES, day_scores, empty_day
+from day_entry import validate as validate_day, build_day
+from migrations import migrate
+from standings import ensure_standings, update_standings, verify_standings, compute_standings, ranking
+from timeline import ensure_timeline, update_timeline, current_form, timeline_from_history, copy_timeline
 
 # --- CONFIGURAZIONE ---
 ADMIN_PASSWORD = "CorteDiFrancia"
 PLAYERS_DEFAULT = ["Infame", "Cammellaccio", "Pierino", "Nicolino"]
+# Le modifiche arrivate entro questa finestra (secondi) vengono scritte sul foglio in un colpo solo
+SAVE_DEBOUNCE_SECONDS = 2.0
+# Modalità diretta per gli spettatori: controllo della versione ogni LIVE_MIN_SECONDS,
+# che raddoppia (fino a LIVE_MAX_SECONDS) finché i dati non cambiano
+LIVE_MIN_SECONDS = 5
+LIVE_MAX_SECONDS = 60
+# Profilazione (solo admin): quanti rerun tenere in memoria per sessione
+PROFILE_WINDOW = 50
+# Senza connessione al database si riprova ad aggiornare la copia locale ogni tot secondi
+OFFLINE_RETRY_SECONDS = 30
+# Registro modifiche (solo admin): quanti salvataggi mostrare
+HISTORY_EVENTS = 30
+# Oltre queste giornate cambiate tra due versioni scaricate, classifica e storico si ricalcolano da capo
+MAX_DERIVED_CHANGES = 50
 
 
 # --- CONNESSIONE A GOOGLE SHEETS ---
-def get_google_sheet():
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-    creds_dict = dict(st.secrets["gcp_service_account"])
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    client = gspread.authorize(creds)
-    sheet_url = st.secrets["private_sheet_url"]
-    sheet = client.open_by_url(sheet_url).sheet1
-    return sheet
+# Pool condiviso da tutte le sessioni del processo: si autorizza e si apre il foglio una volta sola
+@st.cache_resource
+def get_sheet_pool():
+    return SheetPool(dict(st.secrets["gcp_service_account"]), st.secrets["private_sheet_url"])
+
+
+# --- BACKEND DI SALVATAGGIO ---
+# Sezione [storage] dei secrets (backend = "sheets" | "local" | "sqlite", path = ...), oppure
+# variabili d'ambiente TORNEO_STORAGE_BACKEND / TORNEO_STORAGE_PATH. Default: Google Sheets.
+def storage_settings():
+    try:
+        return dict(st.secrets.get("storage", {}))
+    except FileNotFoundError:
+        return {}
+
+
+@st.cache_resource
+def get_backend():
+    return open_backend(storage_settings(), get_sheet_pool)
+
+
+# Copia locale + diario delle modifiche: solo per i backend remoti (Sheets), che possono non rispondere.
+# Percorsi configurabili con snapshot = ... e journal = ... nella sezione [storage].
+@st.cache_resource
+def get_offline():
+    if not get_backend().capabilities["write_behind"]:
+        return None
+    settings = storage_settings()
+    return OfflineStore(settings.get("snapshot", SNAPSHOT_FILE), settings.get("journal", JOURNAL_FILE))
+
+
+# Istantanea dei dati condivisa da tutte le sessioni, già completa di classifica e storico;
+# ogni nuova versione scaricata viene anche salvata su disco (copia locale)
+@st.cache_resource
+def get_loader():
+    offline = get_offline()
+    return VersionedLoader(get_backend(), prepare=ensure_derived,
+                           on_load=offline.write_snapshot_async if offline is not None else None)
+
+
+# Coda di scrittura differita: solo per i backend remoti dove conviene (Sheets)
+@st.cache_resource
+def get_write_queue():
+    backend = get_backend()
+    if not backend.capabilities["write_behind"]:
+        return None
+    return WriteBehindQueue(backend, SAVE_DEBOUNCE_SECONDS, on_saved=get_offline().confirm)
+
+
+def drain_writes():
+    queue = get_write_queue()
+    return queue.drain() if queue is not None else True
+
+
+# Grafici già costruiti, condivisi da tutte le sessioni (vedi FigureCache)
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
 
 
 # --- FUNZIONI LOAD/SAVE ---
-def load_data():
+# Carica il campionato e ricorda in sessione la versione letta (serve alla modalità diretta).
+# I dati restituiti sono l'istantanea condivisa (db_shared): per modificarli serve editable_data().
+def load_data(version=None):
+    st.session_state.edit_version = None
+    st.session_state.db_shared = False
+    st.session_state.db_stale = False
+    st.session_state.db_readonly = False
     try:
-        sheet = get_google_sheet()
-        raw_data = sheet.acell('A1').value
-        if not raw_data:
-            return {"config": {"players": PLAYERS_DEFAULT}, "giornate": {}}
-        data = json.loads(raw_data)
-        for d in data["giornate"].values():
-            if "absent" not in d:
-                d["absent"] = [False] * 4
-        return data
+        with profiler.phase("Caricamento dati"):
+            st.session_state.db_version, data = get_loader().load_versioned(version)
+        st.session_state.db_shared = data is not None
+        return data if data is not None else empty_data(PLAYERS_DEFAULT)
     except Exception as e:
+        local = local_data()
+        if local is not None:
+            st.warning(f"Database non raggiungibile ({e}): mostro l'ultima copia locale. "
+                       "Le modifiche verranno inviate al ritorno della connessione.")
+            return local
         st.error(f"Errore Database: {e}")
-        return {"config": {"players": PLAYERS_DEFAULT}, "giornate": {}}
-
-
-def save_data(data):
+        # Un campionato vuoto salvato ora cancellerebbe quello vero: si blocca il salvataggio
+        st.session_state.db_readonly = True
+        return empty_data(PLAYERS_DEFAULT)
+
+
+# Copia locale (snapshot + modifiche in sospeso) come dati della sessione, da riallineare appena
+# il database risponde (vedi revalidate); None se non c'è una copia locale
+def local_data():
+    offline = get_offline()
+    data = offline.local_state()[0] if offline is not None else None
+    if data is None:
+        return None
+    migrate(data)  # copia salvata prima di un aggiornamento dello schema
+    ensure_derived(data)
+    st.session_state.db_version = None
+    st.session_state.edit_version = uuid.uuid4().hex
+    st.session_state.db_stale = True
+    offline.refresh_async(get_loader())
+    return data
+
+
+# Avvio stale-while-revalidate: se il processo non ha ancora mai letto il backend e c'è una copia
+# locale, si parte subito da quella e l'aggiornamento arriva in background. Non conta la versione in
+# cache del loader: ogni salvataggio la invalida, e le sessioni aperte dopo partirebbero dalla copia
+def initial_data():
+    if get_offline() is not None and not get_backend().loaded():
+        local = local_data()
+        if local is not None:
+            return local
+    return load_data()
+
+
+# Copy-on-write: la sessione che deve modificare i dati (l'admin) lavora su una copia privata,
+# fatta una volta per versione caricata; gli spettatori condividono l'istantanea senza copiarla
+def editable_data():
+    if st.session_state.get("db_shared"):
+        st.session_state.db = copy.deepcopy(st.session_state.db)
+        st.session_state.db_shared = False
+    return st.session_state.db
+
+
+# Identifica il contenuto di st.session_state.db (chiave della cache dei grafici): la versione letta
+# dal backend, oppure un token nuovo dopo ogni modifica locale o se il backend non dà versioni
+def data_version():
+    if st.session_state.get("edit_version") is None and st.session_state.get("db_version") is None:
+        st.session_state.edit_version = uuid.uuid4().hex
+    return st.session_state.get("edit_version") or st.session_state.db_version
+
+
+def chart_theme():
+    return st.context.theme.type or "light"
+
+
+# Classifica e storico cumulativo salvati con i dati: si ricostruiscono solo se mancano o non tornano,
+# o se sono stati calcolati con un altro regolamento (derived_rules = versione del regolamento usato).
+# Con un backend che sa fare query (SQLite) non si tengono in sessione: li calcola il database
+# (render_standings, stats_timeline).
+# previous: versione scaricata prima (vedi VersionedLoader), da cui ripartire invece di ricalcolare
+def ensure_derived(data, previous=None):
+    if get_backend().capabilities["queries"]:
+        for key in ("standings", "timeline", "derived_rules"):
+            data.pop(key, None)
+        return
+    rules_key = data_rules(data).key
+    if data.get("derived_rules") != rules_key:
+        data.pop("standings", None)
+        data.pop("timeline", None)
+        data["derived_rules"] = rules_key
+    if previous is not None and "timeline" not in data:
+        derive_from_previous(data, previous)
+    ensure_standings(data)
+    ensure_timeline(data)
+
+
+# Lo storico non si salva (né in Meta!A1 né nel diario): per una versione nuova lo si ricava da quello
+# della versione precedente (previous, istantanea condivisa da non modificare) riapplicando con
+# update_derived solo le giornate cambiate, aggiunte o tolte. Così anche la classifica, se manca.
+# Se previous non va bene (altro regolamento o giocatori) o è cambiato troppo, resta il ricalcolo completo
+def derive_from_previous(data, previous):
+    rules = data_rules(data)
+    if (previous.get("derived_rules") != rules.key or "timeline" not in previous or "standings" not in previous
+            or previous["config"]["players"] != data["config"]["players"]):
+        return
+    old_days, new_days = previous["giornate"], data["giornate"]
+    changed = [k for k in old_days.keys() | new_days.keys() if old_days.get(k) != new_days.get(k)]
+    if len(changed) > MAX_DERIVED_CHANGES:
+        return
+    work = {"config": data["config"], "giornate": dict(old_days),
+            "standings": copy.deepcopy(previous["standings"]), "timeline": copy_timeline(previous["timeline"])}
+    for day_key in changed:
+        old_day, new_day = old_days.get(day_key), new_days.get(day_key)
+        # update_timeline vuole la giornata presente in work["giornate"] (anche se sta per sparire)
+        work["giornate"][day_key] = new_day if new_day is not None else old_day
+        update_derived(work, day_key, day_scores(old_day, rules) if old_day is not None else None,
+                       day_scores(new_day, rules) if new_day is not None else None)
+        if new_day is None:
+            del work["giornate"][day_key]
+    data["timeline"] = work["timeline"]
+    data.setdefault("standings", work["standings"])
+
+
+# Nuovo regolamento per il campionato: i piazzamenti restano, classifica e storico si ricalcolano
+def set_ruleset(data, ruleset):
+    data["config"]["ruleset"] = ruleset
+    if get_backend().capabilities["queries"]:
+        return
+    # Lo stesso tensore dei confronti "E se...?": cambiano solo le tabelle dei punti
+    rules = data_rules(data)
+    tensor = championship_tensor(data)
+    with profiler.phase("Ricalcolo regolamento"):
+        data["derived_rules"] = rules.key
+        data["standings"] = tensor.standings_table(rules)
+        data["timeline"] = tensor.timeline(rules)
+
+
+# Da chiamare a ogni modifica di una giornata (prima di eliminarla, dopo averla creata)
+def update_derived(data, day_key, old_scores, new_scores):
+    if get_backend().capabilities["queries"]:
+        return
+    update_standings(data, old_scores, new_scores)
+    update_timeline(data, day_key, old_scores, new_scores)
+
+
+# dirty: lista di (giornata, campo) modificati, es. [("Giornata 3", "Gara 5")].
+# Su Sheets si scrivono solo le celle cambiate, in background (vedi WriteBehindQueue);
+# gli altri backend scrivono subito, solo i campi toccati se sanno farlo.
+# Con la copia locale ogni salvataggio finisce prima nel diario su disco, così non si perde
+# nemmeno se il database non risponde o il processo si riavvia prima della scrittura.
+def save_data(data, dirty=None):
+    if st.session_state.get("db_readonly"):
+        st.error("Salvataggio bloccato: i dati non sono stati caricati dal database e salvarli ora "
+                 "sovrascriverebbe il campionato. Premi 🔄 Aggiorna Dati.")
+        return
+    st.session_state.edit_version = uuid.uuid4().hex
     try:
-        sheet = get_google_sheet()
-        json_str = json.dumps(data)
-        sheet.update_acell('A1', json_str)
+        queue = get_write_queue()
+        offline = get_offline()
+        with profiler.phase("Salvataggio"):
+            seq = offline.record(data, dirty) if offline is not None else None
+            if offline is not None and (st.session_state.get("db_stale") or not get_backend().loaded()):
+                # Dati dalla copia locale: la modifica resta nel diario e la riscrive OfflineStore.replay
+                # dopo aver letto il foglio (vedi revalidate), mai calcolata su uno stato mai caricato
+                pass
+            elif queue is not None:
+                if not queue.submit(data, dirty, seq, st.session_state.get("author")) and seq is not None:
+                    offline.confirm_one(seq)
+            elif dirty is not None:
+                get_backend().update(data, dirty)
+            else:
+                get_backend().save(data)
+        get_loader().invalidate()
     except Exception as e:
         st.error(f"Errore salvataggio: {e}")
 
 
+# Dopo una modifica fatta da fuori dei widget (modulo della giornata, annullamento): assenze in
+# sidebar, radio delle gare e scheda SKILL ricordano i valori di prima e li riscriverebbero al rerun
+def forget_day_widgets(day_key):
+    stale = (f"abs_{day_key}_", "r_Gara ", f"rank_bsk_{day_key}_", f"bonus_bsk_{day_key}_",
+             f"rank_drt_{day_key}_", f"bonus_drt_{day_key}_")
+    for key in [k for k in st.session_state if k.startswith(stale)]:
+        del st.session_state[key]
+
+
+# Annulla un evento del registro (vedi event_log.undo_plan) rimettendo i valori di prima, solo se
+# nel frattempo quei campi non sono stati cambiati di nuovo. Restituisce un messaggio d'errore o None
+def undo_event(data, plan):
+    def field_value(day, field):
+        return day["races"][field] if field in RACES else day[field]
+
+    for day_key, field, _, new in plan:
+        if day_key not in data["giornate"] or field_value(data["giornate"][day_key], field) != new:
+            return f"{day_key} ({field}) è stata modificata di nuovo dopo: annullamento non possibile"
+    for day_key in dict.fromkeys(day_key for day_key, _, _, _ in plan):
+        day = data["giornate"][day_key]
+        old_scores = day_scores(day, rules)
+        for d, field, old, _ in plan:
+            if d != day_key:
+                continue
+            if field in RACES:
+                day["races"][field] = old
+            else:
+                day[field] = old
+        update_derived(data, day_key, old_scores, day_scores(day, rules))
+        forget_day_widgets(day_key)
+    save_data(data, [(day_key, field) for day_key, field, _, _ in plan])
+    return None
+
+
+@st.fragment(run_every=2)
+def save_status():
+    queue = get_write_queue()
+    if queue is None:
+        st.caption(f"💾 Salvataggio diretto ({get_backend().name})")
+        return
+    status = queue.status()
+    if status == "pending":
+        st.caption(f"⏳ Salvataggio in corso... ({queue.pending_edits()} modifiche in coda)")
+    elif status == "error":
+        st.caption(f"⚠️ Salvataggio non riuscito, nuovo tentativo a breve: {queue.last_error}")
+    else:
+        st.caption("✅ Tutto salvato")
+    if queue.stats["flushes"]:
+        st.caption(f"Ultima scrittura: {queue.stats['last_flush_ms']} ms | "
+                   f"Modifiche accorpate: {queue.stats['coalesced']}")
+
+
+# Richieste a Google Sheets nell'ultimo minuto rispetto alla quota (vedi SheetPool in sheets.py)
+@st.fragment(run_every=5)
+def sheets_quota():
+    pool = get_sheet_pool()
+    for kind, label in (("read", "Letture"), ("write", "Scritture")):
+        used, quota = pool.usage()[kind]
+        st.progress(min(used / quota, 1.0), text=f"{label} nell'ultimo minuto: {used}/{quota}")
+    st.caption(f"Richieste: {pool.stats['requests']} | Attese per la quota: {pool.stats['throttled']} "
+               f"({pool.stats['throttled_ms'] / 1000:.1f} s) | Nuovi tentativi: {pool.stats['retries']} "
+               f"(quota superata: {pool.stats['quota_errors']})")
+
+
+# Sessione partita dalla copia locale: appena l'aggiornamento in background ha scaricato i dati
+# (e le modifiche in coda sono state scritte) si passa alla versione vera; offline si riprova ogni tanto
+@st.fragment(run_every=2)
+def revalidate():
+    offline, queue = get_offline(), get_write_queue()
+    if offline.refreshing() or (queue is not None and queue.status() == "pending"):
+        st.caption("🔄 Copia locale: aggiornamento dal database in corso...")
+        return
+    if offline.last_refresh_error is None and get_loader().cached_version() is not None:
+        if offline.pending():
+            # Modifiche fatte sulla copia locale dopo l'ultimo aggiornamento: prima vanno riscritte
+            offline.refresh_async(get_loader())
+            st.caption("🔄 Copia locale: invio delle modifiche in attesa...")
+            return
+        st.session_state.db = load_data()
+        st.rerun()
+    age = offline.snapshot_age()
+    st.caption(f"📴 Database non raggiungibile: copia locale di {int(age // 60) if age else 0} min fa | "
+               f"Modifiche in attesa di invio: {len(offline.pending())}")
+    if time.monotonic() - (offline.last_refresh_at or 0) > OFFLINE_RETRY_SECONDS:
+        offline.refresh_async(get_loader())
+
+
+# Modalità diretta: se è ora di controllare e la versione è cambiata, ricarica i dati della sessione.
+# Restituisce True se è cambiato l'intervallo di controllo
+def live_refresh():
+    now = time.monotonic()
+    # Mezzo secondo di margine: il frammento si ripete proprio ogni live_interval secondi
+    if now + 0.5 < st.session_state.get("live_next_poll", 0):
+        return False
+    previous = interval = st.session_state.get("live_interval", LIVE_MIN_SECONDS)
+    version = get_loader().probe(max_age=LIVE_MIN_SECONDS / 2)
+    if version is not None and version != st.session_state.get("db_version"):
+        st.session_state.db = load_data(version)
+        ensure_derived(st.session_state.db)
+        interval = LIVE_MIN_SECONDS
+    else:
+        interval = min(interval * 2, LIVE_MAX_SECONDS)
+    st.session_state.live_interval = interval
+    st.session_state.live_next_poll = now + interval
+    return interval != previous
+
+
 # --- CONFIGURAZIONE PAGINA ---
 st.set_page_config(page_title="🏆GP Torino", page_icon="🏆", layout="wide")
+if st.session_state.get("profiling"): profiler.start("Rerun completo")
+
+# --- HEADER ---
+# Prima di caricare i dati: il titolo arriva al browser mentre si importano gspread e si legge il foglio.
+# pandas, plotly e il client Sheets si importano solo nelle funzioni che li usano (vedi bench_startup.py).
+st.title("🏆 Gran Premio di Torino - Trofeo della Mole")
+st.subheader("📍 Circuito Corso Francia, Torino | Cloud Edition ☁️")
 
 if 'is_admin' not in st.session_state: st.session_state.is_admin = False
-if 'db' not in st.session_state: st.session_state.db = load_data()
+if 'db' not in st.session_state: st.session_state.db = initial_data()
 
 # Ricarica manuale
+live_mode = not st.session_state.is_admin and st.sidebar.toggle(
+    "📡 Diretta", help="Aggiorna da solo classifica e gare quando cambiano i dati")
 if st.sidebar.button("🔄 Aggiorna Dati"):
+    drain_writes()
     st.session_state.db = load_data()
     st.rerun()
 
-data = st.session_state.db
+data = editable_data() if st.session_state.is_admin else st.session_state.db
 players = data["config"]["players"]
+ensure_derived(data)
+rules = data_rules(data)
 
-# --- HEADER ---
-st.title("🏆 Gran Premio di Torino - Trofeo della Mole")
-st.subheader("📍 Circuito Corso Francia, Torino | Cloud Edition ☁️")
+if st.session_state.get("db_stale"): revalidate()
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -76,10 +420,78 @@ with st.sidebar:
             st.rerun()
     else:
         st.success("Admin Connesso")
+        if get_backend().capabilities["history"]:
+            st.text_input("✍️ Il tuo nome", key="author", help="Compare nel registro delle modifiche")
+        save_status()
         if st.button("Logout"):
+            if not drain_writes():
+                st.error("Errore salvataggio: alcune modifiche non sono ancora state scritte")
+                st.stop()
             st.session_state.is_admin = False
             st.rerun()
 
+        loader = get_loader()
+        st.caption(f"📥 Download evitati (versione invariata): {loader.stats['hits']} | "
+                   f"Download completi: {loader.stats['misses']}")
+        figures = get_figure_cache()
+        st.caption(f"📊 Grafici dalla cache: {figures.hit_ratio():.0%} | "
+                   f"Costruzione: {figures.avg_build_ms()} ms in media ({len(figures)} in memoria)")
+
+        with st.expander("⏱️ Profilazione"):
+            st.toggle("Misura i rerun", key="profiling",
+                      help="Tempi di ogni fase, richieste e byte trasferiti (solo per questa sessione)")
+            records = list(st.session_state.get("profile_log", []))
+            if records:
+                import pandas as pd
+                last = records[-1]
+                st.caption(f"Ultimo: {last['tipo']} alle {last['ora']} ({last['totale_ms']} ms)")
+                st.dataframe(pd.DataFrame(
+                    [{"Misura": k, "Ultimo": v} for k, v in {**last["phases"], **last["counters"]}.items()]),
+                    hide_index=True)
+                st.caption(f"Ultimi {len(records)} rerun:")
+                st.dataframe(pd.DataFrame(
+                    [{"Misura": k, "Media": avg, "Max": peak, "Rerun": n}
+                     for k, (avg, peak, n) in profiler.summary(records).items()]), hide_index=True)
+                st.download_button("⬇️ Esporta CSV", profiler.to_csv(records),
+                                   file_name="profilazione.csv", mime="text/csv")
+
+        if get_backend().capabilities["history"]:
+            with st.expander("🧾 Registro modifiche"):
+                # Si legge dal foglio solo su richiesta: ogni lettura consuma quota
+                if st.toggle("Mostra le ultime modifiche", key="show_history"):
+                    import pandas as pd
+                    events = get_backend().recent_events(HISTORY_EVENTS)
+                    rows = [row for event in events for row in describe_event(event, players)]
+                    if rows:
+                        st.dataframe(pd.DataFrame(rows), hide_index=True)
+                    else:
+                        st.caption("Nessuna modifica registrata.")
+                    undoable = undoable_events(events, get_backend().day_of_row)
+                    if undoable:
+                        n = st.selectbox("Modifica da annullare", list(undoable),
+                                         format_func=lambda n: f"N. {n}")
+                        if st.button("↩️ Annulla modifica"):
+                            error = undo_event(data, undoable[n])
+                            if error:
+                                st.error(error)
+                            else:
+                                st.toast(f"Modifica N. {n} annullata", icon="↩️")
+                                st.rerun()
+
+        if get_backend().name == "sheets":
+            with st.expander("☁️ Connessione Sheets"):
+                pool = get_sheet_pool()
+                if st.button("Verifica Connessione"):
+                    health = pool.health_check()
+                    if health["ok"]:
+                        st.success(f"Connessione OK ({health['latency_ms']} ms)")
+                    else:
+                        st.error(f"Connessione KO: {health['error']}")
+                st.caption(f"Autorizzazioni: {pool.stats['authorizations']} (evitate: {pool.stats['auth_avoided']})")
+                st.caption(f"Aperture foglio: {pool.stats['opens']} (evitate: {pool.stats['open_avoided']})")
+                st.caption(f"Riconnessioni: {pool.stats['reconnects']} | Rinnovi token: {pool.stats['token_refreshes']}")
+                sheets_quota()
+
     st.markdown("---")
     st.header("📅 Calendario")
 
@@ -89,10 +501,8 @@ with st.sidebar:
             next_num = max(existing_nums) + 1 if existing_nums else 1
             new_day_key = f"Giornata {next_num}"
 
-            data["giornate"][new_day_key] = {
-                "races": {f"Gara {i + 1}": [0] * 4 for i in range(12)},
-                "basket": [0] * 4, "darts": [0] * 4, "absent": [False] * 4
-            }
+            data["giornate"][new_day_key] = empty_day(len(players))
+            update_derived(data, new_day_key, None, day_scores(data["giornate"][new_day_key], rules))
             save_data(data)
             st.toast(f"{new_day_key} Creata!", icon="✅")
             st.rerun()
@@ -109,6 +519,7 @@ with st.sidebar:
             st.markdown("---")
             st.subheader("🚫 Gestione Assenze")
             day_data_ref = data["giornate"][selected_day]
+            old_scores = day_scores(day_data_ref, rules)
             updated_absent = False
             for i, player in enumerate(players):
                 is_absent = st.checkbox(f"{player} Assente", value=day_data_ref["absent"][i],
@@ -118,13 +529,19 @@ with st.sidebar:
                     if is_absent:
                         day_data_ref["basket"][i] = 0;
                         day_data_ref["darts"][i] = 0
+                        day_data_ref["basket_bonus"][i] = False;
+                        day_data_ref["darts_bonus"][i] = False
                         for r in range(12): day_data_ref["races"][f"Gara {r + 1}"][i] = 0
                     updated_absent = True
-            if updated_absent: save_data(data); st.rerun()
+            if updated_absent:
+                update_derived(data, selected_day, old_scores, day_scores(day_data_ref, rules))
+                save_data(data, [(selected_day, f) for f in DAY_FIELDS]);
+                st.rerun()
 
         if st.session_state.is_admin:
             with st.expander("🗑️ Elimina Giornata"):
                 if st.button("Conferma Eliminazione"):
+                    update_derived(data, selected_day, day_scores(data["giornate"][selected_day], rules), None)
                     del data["giornate"][selected_day]
                     new_dict = {}
                     rem_keys = sorted(data["giornate"].keys(), key=lambda x: int(x.split(" ")[1]))
@@ -134,148 +551,310 @@ with st.sidebar:
                     st.rerun()
 
 # --- LOGICA PUNTEGGI ---
-POINTS_MAP = {"1° Posto": 4, "2° Posto": 3, "3° Posto": 2, "4° Posto": 1, "Nessuno/0": 0}
-REV_POINTS_MAP = {4: "1° Posto", 3: "2° Posto", 2: "3° Posto", 1: "4° Posto", 0: "Nessuno/0"}
-# SKILL POINTS (Can map rank to points directly or reuse POINTS_MAP if keys match needed logic)
-SKILL_POINTS = {1: 12, 2: 9, 3: 6, 4: 3}
+# Si salvano i piazzamenti (0 = non inserito); i punti li dà il regolamento (rules.py)
+PLACING_MAP = {"1° Posto": 1, "2° Posto": 2, "3° Posto": 3, "4° Posto": 4, "Nessuno/0": 0}
+REV_PLACING_MAP = {v: k for k, v in PLACING_MAP.items()}
+
+
+# --- VISTE AGGIORNABILI IN DIRETTA ---
+# Leggono sempre st.session_state.db, così in modalità diretta mostrano i dati appena ricaricati
+def render_race_table(day_key):
+    import pandas as pd
+    day = st.session_state.db["giornate"].get(day_key)
+    if day is None:
+        st.info("Giornata non più disponibile: premi 🔄 Aggiorna Dati.")
+        return
+    summary = {"Gara": [f"Gara {i + 1}" for i in range(12)]}
+    for i, player in enumerate(players):
+        col_name = f"{player} (A)" if day["absent"][i] else player
+        summary[col_name] = [REV_PLACING_MAP.get(day["races"][f"Gara {r + 1}"][i], "-") for r in range(12)]
+    st.dataframe(pd.DataFrame(summary), use_container_width=True, height=400)
+
+
+def render_standings():
+    import pandas as pd
+    if get_backend().capabilities["queries"]:
+        # Classifica calcolata direttamente dal database con query aggregate indicizzate
+        standings = get_backend().standings(players, data_rules(st.session_state.db))
+        df_gen = pd.DataFrame(ranking({"standings": standings}))
+    else:
+        df_gen = pd.DataFrame(ranking(st.session_state.db))
+    df_gen.index += 1
+    st.dataframe(
+        df_gen.style.format({"MEDIA PUNTI": "{:.2f}"}).background_gradient(subset=["MEDIA PUNTI"], cmap="Greens"),
+        use_container_width=True, height=250)
+    if not df_gen.empty:
+        st.markdown(f"### 👑 Leader: <span style='color:#e0bc00'>{df_gen.iloc[0]['Giocatore']}</span>",
+                    unsafe_allow_html=True)
+
+
+# Il frammento si ripete ogni live_interval secondi, che raddoppia finché i dati non cambiano: a
+# riposo la tabella si ridisegna ogni LIVE_MAX_SECONDS, non ogni LIVE_MIN_SECONDS. run_every arriva
+# al browser solo quando il frammento viene dichiarato (rerun completo), quindi quando l'intervallo
+# cambia serve un rerun dell'app: poche volte per ogni serie di controlli a vuoto
+def live_fragment(render, *args):
+    if live_refresh():
+        st.rerun(scope="app")
+    render(*args)
+
+
+def live_race_table(day_key):
+    st.fragment(live_fragment, run_every=st.session_state.get("live_interval", LIVE_MIN_SECONDS))(
+        render_race_table, day_key)
+
+
+def live_standings():
+    st.fragment(live_fragment, run_every=st.session_state.get("live_interval", LIVE_MIN_SECONDS))(
+        render_standings)
+
+
+# --- SCHEDE COME FRAMMENTI ---
+# Ogni scheda è un st.fragment: un'interazione al suo interno (es. un radio in GARE) riesegue solo
+# quella scheda. Si esegue solo la scheda aperta (tabN.open): cambiare scheda riesegue lo script,
+# che calcola e disegna la nuova scheda saltando le altre.
+# I dati condivisi arrivano da st.session_state.db e dai punteggi memorizzati in scoring.py.
+def day_context(day_key):
+    data = st.session_state.db
+    day_data = data["giornate"][day_key]
+    return data, day_data, day_data["absent"]
+
+
+# Registro dei rerun misurati (profilazione attiva dall'Area Admin), ultimi PROFILE_WINDOW
+def log_profile(record):
+    if record is not None:
+        st.session_state.setdefault("profile_log", deque(maxlen=PROFILE_WINDOW)).append(record)
+
+
+# Misura una scheda: dentro un rerun completo è una fase; se il frammento si riesegue da solo
+# (es. un radio in GARE) diventa una voce a sé del registro.
+# st.rerun()/st.stop() nella scheda interrompono lo script con un'eccezione: la misura del rerun
+# completo si chiude qui, perché log_profile in fondo allo script non verrebbe raggiunto
+def profiled_tab(name):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            own = st.session_state.get("profiling") and not profiler.active()
+            if own:
+                profiler.start(f"Frammento {name}")
+            completed = False
+            try:
+                with profiler.phase(f"Scheda {name}"):
+                    result = fn(*args, **kwargs)
+                completed = True
+                return result
+            finally:
+                if own or not completed:
+                    log_profile(profiler.stop())
+        return wrapper
+    return decorator
+
 
 if selected_day is None: st.stop()
-day_data = data["giornate"][selected_day]
-absent_flags = day_data["absent"]
 
 # --- TABS ---
+# La scheda aperta è ricordata tra un rerun e l'altro ed è nell'URL (?vista=...), così si può
+# condividere il link diretto a una scheda, es. alla classifica generale
 tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
-    ["🏎️ GARE", "🎯 SKILL", "🥇 GIORNATA", "🌍 GENERALE", "📈 STATISTICHE", "📜 REGOLAMENTO"])
+    ["🏎️ GARE", "🎯 SKILL", "🥇 GIORNATA", "🌍 GENERALE", "📈 STATISTICHE", "📜 REGOLAMENTO"],
+    key="vista", on_change="rerun", bind="query-params")
+
+# Modulo unico per tutta la giornata (vedi day_entry.py): i widget di un form non fanno rerun,
+# quindi nulla viene scritto finché non si preme Salva, e allora si scrive tutto insieme
+SKILL_RANKS = ["1°", "2°", "3°", "4°"]
+
+
+def day_form(selected_day):
+    import pandas as pd
+    data, day_data, absent_flags = day_context(selected_day)
+    rules = data_rules(data)
+    form_key = f"{selected_day}_{data_version()}"
+    skill_rows = [{
+        "Giocatore": p,
+        "Basket": f"{day_data['basket'][i]}°" if day_data["basket"][i] else None,
+        "Bonus basket": day_data["basket_bonus"][i],
+        "Freccette": f"{day_data['darts'][i]}°" if day_data["darts"][i] else None,
+        "Bonus freccette": day_data["darts_bonus"][i],
+    } for i, p in enumerate(players)]
+
+    with st.form(f"day_form_{form_key}"):
+        st.caption("Assenze, gare e skill della giornata: si salva tutto insieme, con una sola scrittura.")
+        st.markdown("**🚫 Assenze**")
+        cols = st.columns(4)
+        absent = [cols[i].checkbox(f"{p} Assente", value=absent_flags[i], key=f"batch_abs_{form_key}_{i}")
+                  for i, p in enumerate(players)]
+        st.markdown("**🏁 Gare** (i piazzamenti degli assenti vengono ignorati)")
+        grid = st.data_editor(
+            pd.DataFrame({p: [REV_PLACING_MAP.get(day_data["races"][r][i], "Nessuno/0") for r in RACES]
+                          for i, p in enumerate(players)}, index=RACES),
+            column_config={p: st.column_config.SelectboxColumn(p, options=list(PLACING_MAP), required=True)
+                           for p in players},
+            use_container_width=True, key=f"batch_races_{form_key}")
+        st.markdown("**🏀🎯 Skill**")
+        skill = st.data_editor(
+            pd.DataFrame(skill_rows),
+            column_config={
+                "Giocatore": st.column_config.TextColumn(disabled=True),
+                "Basket": st.column_config.SelectboxColumn(options=SKILL_RANKS),
+                "Bonus basket": st.column_config.CheckboxColumn("Bonus (>=20pt)"),
+                "Freccette": st.column_config.SelectboxColumn(options=SKILL_RANKS),
+                "Bonus freccette": st.column_config.CheckboxColumn("Bonus (<=3 Rnd)"),
+            },
+            hide_index=True, use_container_width=True, key=f"batch_skill_{form_key}")
+        submitted = st.form_submit_button("💾 Salva Giornata", type="primary")
+
+    if not submitted:
+        return
+    races = {r: [PLACING_MAP[grid.loc[r, p]] for p in players] for r in RACES}
+    # Posizione vuota = None (pandas la restituisce come NaN se la colonna è tutta vuota)
+    rank = lambda label: int(label[0]) if isinstance(label, str) and label else None
+    rows = skill.to_dict("records")
+    basket = [(rank(row["Basket"]), bool(row["Bonus basket"])) for row in rows]
+    darts = [(rank(row["Freccette"]), bool(row["Bonus freccette"])) for row in rows]
+    errors = validate_day(players, absent, races, [b[0] for b in basket], [d[0] for d in darts])
+    if errors:
+        st.error("Giornata non salvata:\n\n" + "\n".join(f"- {e}" for e in errors))
+        return
+    new_day = build_day(day_data, absent, races, basket, darts)
+    if new_day == day_data:
+        st.info("Nessuna modifica da salvare.")
+        return
+    old_scores = day_scores(day_data, rules)
+    data["giornate"][selected_day] = new_day
+    update_derived(data, selected_day, old_scores, day_scores(new_day, rules))
+    save_data(data, [(selected_day, f) for f in DAY_FIELDS])
+    forget_day_widgets(selected_day)
+    st.toast(f"{selected_day} salvata!", icon="✅")
+    st.rerun()
+
 
 # TAB 1: GARE
-with tab1:
+@st.fragment
+@profiled_tab("GARE")
+def tab_gare(selected_day):
+    data, day_data, absent_flags = day_context(selected_day)
     st.header(f"Risultati - {selected_day}")
-    if st.session_state.is_admin:
+    if st.session_state.is_admin and st.toggle(
+            "📝 Giornata completa", key="batch_entry",
+            help="Tutte le gare, le assenze e le skill in un solo modulo, salvate con una sola scrittura"):
+        day_form(selected_day)
+    elif st.session_state.is_admin:
         race_num = st.selectbox("Seleziona Gara:", [f"Gara {i + 1}" for i in range(12)])
         cols = st.columns(4)
         current_vals = day_data["races"][race_num]
+        rules = data_rules(data)
+        old_scores = day_scores(day_data, rules)
         updated = False
         for i, player in enumerate(players):
             with cols[i]:
                 disabled = absent_flags[i]
                 label = f"{player} (ASSENTE)" if disabled else player
-                current_label = REV_POINTS_MAP.get(current_vals[i], "Nessuno/0")
+                current_label = REV_PLACING_MAP.get(current_vals[i], "Nessuno/0")
                 val = st.radio(label, options=["1° Posto", "2° Posto", "3° Posto", "4° Posto", "Nessuno/0"],
                                    index=["1° Posto", "2° Posto", "3° Posto", "4° Posto", "Nessuno/0"].index(
                                        current_label),
                                    key=f"r_{race_num}_{i}", disabled=disabled)
                 if not disabled:
-                    new_score = POINTS_MAP[val]
-                    if new_score != current_vals[i]: day_data["races"][race_num][i] = new_score; updated = True
-        if updated: save_data(data)
-    summary = {"Gara": [f"Gara {i + 1}" for i in range(12)]}
-    for i, player in enumerate(players):
-        col_name = f"{player} (A)" if absent_flags[i] else player
-        summary[col_name] = [REV_POINTS_MAP.get(day_data["races"][f"Gara {r + 1}"][i], "-") for r in range(12)]
-    st.dataframe(pd.DataFrame(summary), use_container_width=True, height=400)
+                    new_placing = PLACING_MAP[val]
+                    if new_placing != current_vals[i]: day_data["races"][race_num][i] = new_placing; updated = True
+        if updated:
+            update_derived(data, selected_day, old_scores, day_scores(day_data, rules))
+            save_data(data, [(selected_day, race_num)])
+    if live_mode:
+        live_race_table(selected_day)
+    else:
+        render_race_table(selected_day)
+
+
+if tab1.open:
+    with tab1:
+        tab_gare(selected_day)
+
 
 # TAB 2: SKILL
-with tab2:
+@st.fragment
+@profiled_tab("SKILL")
+def tab_skill(selected_day):
+    import pandas as pd
+    data, day_data, absent_flags = day_context(selected_day)
     st.header("Skill & Bonus")
-    st.info("Punteggi: 1°=12, 2°=9, 3°=6, 4°=3. Bonus = +5 punti.")
-    
+    rules = data_rules(data)
+    st.info("Punteggi: " + ", ".join(f"{rank}°={pts}" for rank, pts in enumerate(rules.skill_table) if rank)
+            + f". Bonus = +{rules.skill_bonus} punti.")
+
     if st.session_state.is_admin:
-        updated_sk = False
+        # Posizione e bonus sono quelli salvati; le chiavi per giornata evitano di portarsi dietro
+        # i valori di un'altra giornata
+        options = [0, 1, 2, 3, 4]
+        rank_label = lambda rank: f"{rank}°" if rank else "-"
         c1, c2 = st.columns(2)
-        
-        # BASKET
-        with c1:
-            st.subheader("🏀 Basket")
-            for i, p in enumerate(players):
-                if not absent_flags[i]:
-                    # Determine current rank/bonus from stored score if possible, or default to 4th/NoBonus
-                    # Since we store TOTAL points, we can't easily reverse engineer without stored state.
-                    # We will just show inputs to overwrite.
+        for col, field, title, short, bonus_label in (
+                (c1, "basket", "🏀 Basket", "bsk", "Bonus (>=20pt)"),
+                (c2, "darts", "🎯 Freccette", "drt", "Bonus (<=3 Rnd)")):
+            with col:
+                st.subheader(title)
+                for i, p in enumerate(players):
+                    if absent_flags[i]:
+                        continue
                     st.markdown(f"**{p}**")
                     col_rank, col_bonus = st.columns([2, 1])
                     with col_rank:
-                        rank_bsk = st.selectbox(f"Posizione {p}", options=[1, 2, 3, 4], key=f"rank_bsk_{i}")
+                        rank = st.selectbox(f"Posizione {p}", options=options, format_func=rank_label,
+                                            index=options.index(day_data[field][i]),
+                                            key=f"rank_{short}_{selected_day}_{i}")
                     with col_bonus:
-                        bonus_bsk = st.checkbox(f"Bonus (>=20pt)", key=f"bonus_bsk_{i}")
-                    
-                    calc_score = SKILL_POINTS[rank_bsk] + (5 if bonus_bsk else 0)
-                    # We only update if it looks like a NEW interaction or we trust the user inputs match current state.
-                    # Problem: on refresh, selectbox resets to default (index 0 -> 1st place) if we don't bind 'value' or 'index'.
-                    # But we don't store rank/bonus separately. 
-                    # DECISION: Just let the user overwrite. It shows "1" by default. 
-                    # Better: display current points next to it.
-                    st.caption(f"Salverà: {calc_score} pt (Attuale: {day_data['basket'][i]})")
-                    
-                    # We need a button to "Apply" or just apply if changed? 
-                    # Since we can't reconstruct state, let's add a "Salva" button per section or global?
-                    # Auto-update might be annoying if it resets to 12 pts immediately.
-                    
-        # DARTS
-        with c2:
-            st.subheader("🎯 Freccette")
-            for i, p in enumerate(players):
-                if not absent_flags[i]:
-                    st.markdown(f"**{p}**")
-                    col_rank_d, col_bonus_d = st.columns([2, 1])
-                    with col_rank_d:
-                        rank_drt = st.selectbox(f"Posizione {p}", options=[1, 2, 3, 4], key=f"rank_drt_{i}")
-                    with col_bonus_d:
-                        bonus_drt = st.checkbox(f"Bonus (<=3 Rnd)", key=f"bonus_drt_{i}")
-                    
-                    calc_score_d = SKILL_POINTS[rank_drt] + (5 if bonus_drt else 0)
-                    st.caption(f"Salverà: {calc_score_d} pt (Attuale: {day_data['darts'][i]})")
+                        bonus = st.checkbox(bonus_label, value=day_data[f"{field}_bonus"][i],
+                                            key=f"bonus_{short}_{selected_day}_{i}")
+                    st.caption(f"Salverà: {rules.skill(rank, bonus and rank > 0)} pt")
 
         if st.button("💾 Salva Risultati Skill"):
-            # Apply Basket
+            old_scores = day_scores(day_data, rules)
             for i, p in enumerate(players):
                 if not absent_flags[i]:
-                    # Retrieving values from session state using keys
-                    r_b = st.session_state[f"rank_bsk_{i}"]
-                    b_b = st.session_state[f"bonus_bsk_{i}"]
-                    day_data["basket"][i] = SKILL_POINTS[r_b] + (5 if b_b else 0)
-                    
-                    r_d = st.session_state[f"rank_drt_{i}"]
-                    b_d = st.session_state[f"bonus_drt_{i}"]
-                    day_data["darts"][i] = SKILL_POINTS[r_d] + (5 if b_d else 0)
-            
-            save_data(data)
+                    for field, short in (("basket", "bsk"), ("darts", "drt")):
+                        rank = st.session_state[f"rank_{short}_{selected_day}_{i}"]
+                        day_data[field][i] = rank
+                        day_data[f"{field}_bonus"][i] = rank > 0 and st.session_state[f"bonus_{short}_{selected_day}_{i}"]
+
+            update_derived(data, selected_day, old_scores, day_scores(day_data, rules))
+            save_data(data, [(selected_day, f) for f in ("basket", "darts", "basket_bonus", "darts_bonus")])
             st.success("Salvataggio completato!")
             st.rerun()
 
     sk_disp = []
-    for i, p in enumerate(players):
+    for i, (p, sc) in enumerate(zip(players, day_scores(day_data, rules))):
         status = "ASSENTE" if absent_flags[i] else "Presente"
-        sk_disp.append(
-            {"Giocatore": p, "Stato": status, "Basket (Pt)": day_data["basket"][i], "Darts (Pt)": day_data["darts"][i]})
+        sk_disp.append({"Giocatore": p, "Stato": status,
+                        "Basket (Pt)": sc["basket"] if sc else 0, "Darts (Pt)": sc["darts"] if sc else 0})
     st.dataframe(pd.DataFrame(sk_disp), use_container_width=True)
 
+
+if tab2.open:
+    with tab2:
+        tab_skill(selected_day)
+
+
 # TAB 3: GIORNATA
-with tab3:
+@st.fragment
+@profiled_tab("GIORNATA")
+def tab_giornata(selected_day):
+    import pandas as pd
+    data, day_data, absent_flags = day_context(selected_day)
+    rules = data_rules(data)
     d_stats = []
     perfect_score_player = None
 
-    for i, p in enumerate(players):
-        if not absent_flags[i]:
-            race_points = [day_data["races"][f"Gara {r + 1}"][i] for r in range(12)]
-            mk8_sum = sum(race_points)
-            skill = day_data["basket"][i] + day_data["darts"][i]
-
-            bonus_grand_slam = 0
-            if race_points.count(4) == 12:
-                bonus_grand_slam = 10
+    for p, sc in zip(players, day_scores(day_data, rules)):
+        if sc is not None:
+            if sc["bonus_gs"] > 0:
                 perfect_score_player = p
 
-            bonus_5_wins = 5 if race_points.count(4) >= 5 else 0
-
-            total = mk8_sum + skill + bonus_grand_slam + bonus_5_wins
-
             d_stats.append({
                 "Giocatore": p,
-                "MK8": mk8_sum,
-                "Skill": skill,
-                "Bonus 5W": f"+{bonus_5_wins}" if bonus_5_wins > 0 else "-",
-                "Bonus 12/12": f"+{bonus_grand_slam}" if bonus_grand_slam > 0 else "-",
-                "TOTALE": total
+                "MK8": sc["mk8"],
+                "Skill": sc["skill"],
+                "Bonus 5W": f"+{sc['bonus_5w']}" if sc["bonus_5w"] > 0 else "-",
+                "Bonus 12/12": f"+{sc['bonus_gs']}" if sc["bonus_gs"] > 0 else "-",
+                "TOTALE": sc["total"]
             })
 
     if d_stats:
@@ -285,48 +864,152 @@ with tab3:
 
         if perfect_score_player:
             st.balloons()
-            st.markdown(f"## 🤯 INCREDIBILE! {perfect_score_player} HA FATTO 12 SU 12! (+10 PUNTI)")
+            st.markdown(f"## 🤯 INCREDIBILE! {perfect_score_player} HA FATTO 12 SU 12! (+{rules.grand_slam_bonus} PUNTI)")
 
         st.success(f"🏆 Vincitore Giornata: **{df_d.iloc[0]['Giocatore']}**")
     else:
         st.info("Nessun giocatore presente.")
 
+
+if tab3.open:
+    with tab3:
+        tab_giornata(selected_day)
+
+
 # TAB 4: GENERALE
-with tab4:
+@st.fragment
+@profiled_tab("GENERALE")
+def tab_generale():
+    data = st.session_state.db
     st.header("🌍 CLASSIFICA GENERALE")
-    gen_stats = {p: {"Totale": 0, "Presenze": 0} for p in players}
-    for g_data in data["giornate"].values():
-        g_absent = g_data.get("absent", [False] * 4)
-        for i, p in enumerate(players):
-            if not g_absent[i]:
-                race_points = [g_data["races"][f"Gara {r + 1}"][i] for r in range(12)]
-                mk8 = sum(race_points)
-                grand_slam = 10 if race_points.count(4) == 12 else 0
-                bonus_5_wins = 5 if race_points.count(4) >= 5 else 0
-                skill = g_data["basket"][i] + g_data["darts"][i]
-
-                gen_stats[p]["Presenze"] += 1
-                gen_stats[p]["Totale"] += (mk8 + skill + grand_slam + bonus_5_wins)
-
-    final_list = []
-    for p, s in gen_stats.items():
-        pg = s["Presenze"]
-        media = round(s["Totale"] / pg, 2) if pg > 0 else 0.0
-        final_list.append(
-            {"Giocatore": p, "PG": pg, "Totale Punti": s["Totale"], "MEDIA PUNTI": media})
-
-    df_gen = pd.DataFrame(final_list).sort_values(by=["MEDIA PUNTI", "Totale Punti"], ascending=False).reset_index(
-        drop=True)
-    df_gen.index += 1
-    st.dataframe(
-        df_gen.style.format({"MEDIA PUNTI": "{:.2f}"}).background_gradient(subset=["MEDIA PUNTI"], cmap="Greens"),
-        use_container_width=True, height=250)
-    if not df_gen.empty:
-        st.markdown(f"### 👑 Leader: <span style='color:#e0bc00'>{df_gen.iloc[0]['Giocatore']}</span>",
-                    unsafe_allow_html=True)
+    if st.session_state.is_admin and not get_backend().capabilities["queries"] and st.checkbox(
+            "🔍 Verifica classifica (ricalcolo completo)"):
+        mismatched = verify_standings(data)
+        if mismatched:
+            st.warning(f"Classifica incrementale non allineata per: {', '.join(mismatched)}. Ricostruita.")
+            data["standings"] = compute_standings(data)
+            save_data(data)
+        else:
+            st.success("Classifica incrementale allineata al ricalcolo completo.")
+
+    if live_mode:
+        live_standings()
+    else:
+        render_standings()
+
+    if st.toggle("🔮 E se...? Classifica con altri regolamenti", key="what_if",
+                 help="Ricalcola tutto lo storico con i regolamenti scelti e li confronta con quello in vigore"):
+        what_if(data)
+
+
+# Tensore del campionato per i confronti tra regolamenti e per il cambio di regolamento (set_ruleset):
+# uno per versione dei dati, in sessione
+def championship_tensor(data):
+    from tensor import ChampionshipTensor
+    cached = st.session_state.get("whatif_tensor")
+    if cached is None or cached[0] != data_version():
+        with profiler.phase("Tensore campionato"):
+            cached = (data_version(), ChampionshipTensor.from_data(data))
+        st.session_state.whatif_tensor = cached
+    return cached[1]
+
+
+# Tutte le combinazioni dei valori scelti, confrontate con il regolamento in vigore (vedi whatif.py)
+def what_if(data):
+    import pandas as pd
+    from whatif import RACE_SCALES, SKILL_SCALES, MAX_CANDIDATES, candidate_rulesets, describe, sweep
+    current = data_rules(data)
+    ruleset = current.ruleset
+    # Valori proposti: sempre anche quello in vigore; di partenza il regolamento attuale contro
+    # tutte le scale skill e i bonus azzerati
+    values = lambda key, options: sorted(set(options) | {ruleset[key]})
+    race_default = [n for n, s in RACE_SCALES.items() if s == ruleset["race_points"]] or [next(iter(RACE_SCALES))]
+    c1, c2, c3 = st.columns(3)
+    race_scales = c1.multiselect("Punti gara", list(RACE_SCALES), default=race_default)
+    skill_scales = c1.multiselect("Punti skill", list(SKILL_SCALES), default=list(SKILL_SCALES))
+    skill_bonus = c2.multiselect("Bonus skill", values("skill_bonus", [0, 3, 5, 8, 10]),
+                                 default=sorted({0, ruleset["skill_bonus"]}))
+    grand_slam = c2.multiselect("Bonus 12/12", values("grand_slam_bonus", [0, 5, 10, 15, 20]),
+                                default=sorted({0, ruleset["grand_slam_bonus"]}))
+    five_wins = c3.multiselect("Bonus vittorie", values("five_wins_bonus", [0, 3, 5, 8, 10]),
+                               default=sorted({0, ruleset["five_wins_bonus"]}))
+    five_wins_min = c3.multiselect("Vittorie per il bonus", values("five_wins_min", range(3, 9)),
+                                   default=[ruleset["five_wins_min"]])
+    candidates = candidate_rulesets(
+        [RACE_SCALES[n] for n in race_scales], [SKILL_SCALES[n] for n in skill_scales],
+        skill_bonus, grand_slam, five_wins, five_wins_min)
+    if not candidates:
+        st.info("Scegli almeno un valore per ogni voce.")
+        return
+    if len(candidates) > MAX_CANDIDATES:
+        st.warning(f"{len(candidates)} combinazioni: il massimo è {MAX_CANDIDATES}, togli qualche valore.")
+        return
+
+    start = time.perf_counter()
+    with profiler.phase("E se: ricalcolo"):
+        result = sweep(championship_tensor(data), current, candidates)
+    ranks, moved = result["ranks"], result["moved"]
+    leader = players[ranks[0].argmin()]
+    st.caption(f"{len(candidates)} regolamenti ricalcolati su {len(data['giornate'])} giornate in "
+               f"{(time.perf_counter() - start) * 1000:.0f} ms | Leader cambiato in "
+               f"{int((ranks[1:].argmin(axis=1) != ranks[0].argmin()).sum())}, "
+               f"classifica diversa in {int((moved[1:] > 0).sum())}")
+
+    order = lambda k: " > ".join(players[i] for i in ranks[k].argsort())
+    summary = pd.DataFrame([{
+        "Regolamento": describe(result["rules"][k].ruleset), "Leader": players[ranks[k].argmin()],
+        "Classifica": order(k), "Posizioni cambiate": int(moved[k]),
+    } for k in range(1, len(result["rules"]))])
+    summary = summary.sort_values("Posizioni cambiate", ascending=False, kind="stable").reset_index()
+    st.dataframe(summary.drop(columns="index"), hide_index=True, use_container_width=True, height=250)
+
+    # Affiancate: classifica in vigore e quella del regolamento scelto
+    choice = st.selectbox("Confronta con:", summary.index, format_func=lambda i: summary.loc[i, "Regolamento"])
+    k = int(summary.loc[choice, "index"]) + 1
+    delta = lambda i: int(ranks[0][i] - ranks[k][i])
+    rows = [{
+        "Giocatore": p,
+        "Pos. attuale": int(ranks[0][i]), "Media attuale": float(result["media"][0][i]),
+        "Pos. e se": int(ranks[k][i]), "Media e se": float(result["media"][k][i]),
+        "Totale e se": int(result["totals"][k][i]),
+        "Δ": f"▲{delta(i)}" if delta(i) > 0 else (f"▼{-delta(i)}" if delta(i) < 0 else "="),
+    } for i, p in enumerate(players)]
+    st.dataframe(pd.DataFrame(rows).sort_values("Pos. e se"), hide_index=True, use_container_width=True,
+                 column_config={"Media attuale": st.column_config.NumberColumn(format="%.2f"),
+                                "Media e se": st.column_config.NumberColumn(format="%.2f")})
+    if players[ranks[k].argmin()] != leader:
+        st.markdown(f"👑 Con questo regolamento vincerebbe **{players[ranks[k].argmin()]}** invece di {leader}.")
+
+
+if tab4.open:
+    with tab4:
+        tab_generale()
+
+
+# Storico cumulativo per STATISTICHE: quello in sessione, o con SQLite quello ricostruito dai
+# punteggi per giocatore del database, una volta per versione dei dati
+def stats_timeline(data):
+    if not get_backend().capabilities["queries"]:
+        return data["timeline"]
+    cached = st.session_state.get("sql_timeline")
+    if cached is None or cached[0] != data_version():
+        rules = data_rules(data)
+        with profiler.phase("SQLite: storico"):
+            histories = {p: get_backend().player_history(i, rules) for i, p in enumerate(players)}
+        day_nums = sorted(int(day_key.split(" ")[1]) for day_key in data["giornate"])
+        cached = (data_version(), timeline_from_history(players, day_nums, histories))
+        st.session_state.sql_timeline = cached
+    return cached[1]
+
 
 # TAB 5: STATISTICHE
-with tab5:
+@st.fragment
+@profiled_tab("STATISTICHE")
+def tab_statistiche():
+    # plotly solo quando serve davvero un grafico (la scheda si esegue solo se è aperta)
+    from charts import build_scalata_figure, build_radar_figure
+    data = st.session_state.db
+    timeline = stats_timeline(data)
     st.header("📱 Statistiche Rapide")
 
     if len(data["giornate"]) > 0:
@@ -334,66 +1017,19 @@ with tab5:
         st.subheader("🔥 Forma Attuale (Ultime 3 Presenze)")
         cols = st.columns(2)
 
-        for p in players:
-            scores_history = []
-            for d in giornate_sorted:
-                d_data = data["giornate"][d]
-                idx = players.index(p)
-                if not d_data.get("absent", [False] * 4)[idx]:
-                    r_pts = [d_data["races"][f"Gara {r + 1}"][idx] for r in range(12)]
-                    bonus_gs = 10 if r_pts.count(4) == 12 else 0
-                    bonus_5w = 5 if r_pts.count(4) >= 5 else 0
-                    day_total = sum(r_pts) + d_data["basket"][idx] + d_data["darts"][idx] + bonus_gs + bonus_5w
-                    scores_history.append(day_total)
-
-            if not scores_history:
-                curr_form = 0;
-                diff = 0
-            else:
-                last_3_games = scores_history[-3:]
-                curr_form = sum(last_3_games) / len(last_3_games)
-
-                if len(scores_history) > 1:
-                    prev_3_games = scores_history[:-1][-3:]
-                    prev_form = sum(prev_3_games) / len(prev_3_games)
-                    diff = curr_form - prev_form
-                else:
-                    diff = 0
+        for idx, p in enumerate(players):
+            curr_form, diff = current_form(timeline[p])
 
-            with cols[players.index(p) % 2]:
+            with cols[idx % 2]:
                 st.metric(label=p, value=f"{curr_form:.1f}", delta=f"{diff:.1f}", delta_color="normal")
 
         st.markdown("---")
 
         # --- 2. GRAFICO LINEE ---
         st.subheader("📈 La Scalata")
-
-        history_rows = []
-        cum_points = {p: 0 for p in players}
-        cum_games = {p: 0 for p in players}
-
-        for day_idx, day_key in enumerate(giornate_sorted):
-            d_data = data["giornate"][day_key]
-            d_absent = d_data.get("absent", [False] * 4)
-            x_axis = day_idx + 1
-            for i, p in enumerate(players):
-                if not d_absent[i]:
-                    r_pts = [d_data["races"][f"Gara {r + 1}"][i] for r in range(12)]
-                    bonus_gs = 10 if r_pts.count(4) == 12 else 0
-                    bonus_5w = 5 if r_pts.count(4) >= 5 else 0
-                    points_today = sum(r_pts) + d_data["basket"][i] + d_data["darts"][i] + bonus_gs + bonus_5w
-
-                    cum_points[p] += points_today;
-                    cum_games[p] += 1
-                current_avg = cum_points[p] / cum_games[p] if cum_games[p] > 0 else 0
-                history_rows.append({"Giornata": f"G{x_axis}", "Giocatore": p, "Media": round(current_avg, 2)})
-
-        df_hist = pd.DataFrame(history_rows)
-        fig_line = px.line(df_hist, x="Giornata", y="Media", color="Giocatore", markers=True, symbol="Giocatore")
-        fig_line.update_layout(
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-            margin=dict(l=20, r=20, t=20, b=20), xaxis_title=None, yaxis_title=None, showlegend=True
-        )
+        with profiler.phase("Grafico: La Scalata"):
+            fig_line = get_figure_cache().get((data_version(), "scalata", None, chart_theme()),
+                                              lambda: build_scalata_figure(timeline, players))
         st.plotly_chart(fig_line, use_container_width=True)
 
         st.markdown("---")
@@ -401,89 +1037,41 @@ with tab5:
         # --- 3. GRAFICO RADAR (NORMALIZZATO IN %) ---
         st.subheader("🕹️ Stile di Gioco (Efficienza %)")
         st.caption("Confronto proporzionale: quanto sei vicino alla perfezione in ogni categoria?")
-
-        # Inizializziamo i contatori per i totali reali e i massimi possibili
-        # "Wins": 12 possibili per giornata
-        # "Basket": 30 possibili per giornata
-        # "Darts": 10 possibili per giornata
-
-        style_stats = {p: {
-            "Wins_Actual": 0, "Wins_Max": 0,
-            "Basket_Actual": 0, "Basket_Max": 0,
-            "Darts_Actual": 0, "Darts_Max": 0
-        } for p in players}
-
-        for g_data in data["giornate"].values():
-            for i, p in enumerate(players):
-                # Se il giocatore era presente, incrementiamo i suoi contatori e i massimi possibili
-                if not g_data.get("absent", [False] * 4)[i]:
-                    # Basket
-                    style_stats[p]["Basket_Actual"] += g_data["basket"][i]
-                    style_stats[p]["Basket_Max"] += 17  # Max giornaliero basket (12 + 5)
-
-                    # Darts
-                    style_stats[p]["Darts_Actual"] += g_data["darts"][i]
-                    style_stats[p]["Darts_Max"] += 17  # Max giornaliero darts (12 + 5)
-
-                    # Wins (Conta i primi posti)
-                    wins_today = 0
-                    for race_scores in g_data["races"].values():
-                        if race_scores[i] == 4:
-                            wins_today += 1
-                    style_stats[p]["Wins_Actual"] += wins_today
-                    style_stats[p]["Wins_Max"] += 12  # Max vittorie possibili (12 gare)
-
-        categories = ['Vittorie (1°)', 'Canestri', 'Freccette']
         selected_player_radar = st.selectbox("Analizza Giocatore:", players)
-
-        # Calcolo percentuali (Gestione divisione per zero se uno non ha mai giocato)
-        stats = style_stats[selected_player_radar]
-
-        perc_wins = (stats["Wins_Actual"] / stats["Wins_Max"] * 100) if stats["Wins_Max"] > 0 else 0
-        perc_basket = (stats["Basket_Actual"] / stats["Basket_Max"] * 100) if stats["Basket_Max"] > 0 else 0
-        perc_darts = (stats["Darts_Actual"] / stats["Darts_Max"] * 100) if stats["Darts_Max"] > 0 else 0
-
-        vals_perc = [perc_wins, perc_basket, perc_darts]
-
-        # Per il tooltip mostriamo anche i valori veri
-        hover_text = [
-            f"{stats['Wins_Actual']} su {stats['Wins_Max']} possibili",
-            f"{stats['Basket_Actual']} su {stats['Basket_Max']} possibili",
-            f"{stats['Darts_Actual']} su {stats['Darts_Max']} possibili"
-        ]
-
-        fig_radar = go.Figure()
-        fig_radar.add_trace(go.Scatterpolar(
-            r=vals_perc,
-            theta=categories,
-            fill='toself',
-            name=selected_player_radar,
-            line_color='#e0bc00',
-            text=hover_text,
-            hovertemplate="%{theta}: %{r:.1f}%<br>(%{text})<extra></extra>"
-        ))
-
-        fig_radar.update_layout(
-            polar=dict(
-                radialaxis=dict(
-                    visible=True,
-                    range=[0, 100],  # Scala fissa 0-100%
-                    ticksuffix="%"
-                )
-            ),
-            showlegend=False,
-            margin=dict(l=40, r=40, t=20, b=20)
-        )
+        with profiler.phase("Grafico: Radar"):
+            fig_radar = get_figure_cache().get((data_version(), "radar", selected_player_radar, chart_theme()),
+                                               lambda: build_radar_figure(timeline, selected_player_radar,
+                                                                          data_rules(data).skill_max))
         st.plotly_chart(fig_radar, use_container_width=True)
 
     else:
         st.info("Dati insufficienti.")
 
+
+if tab5.open:
+    with tab5:
+        tab_statistiche()
+
+
 # TAB 6: REGOLAMENTO
-with tab6:
+@profiled_tab("REGOLAMENTO")
+def tab_regolamento():
     st.markdown("# 📜 Regolamento Ufficiale")
     st.markdown("### Gran Premio di Torino – 🏆 Trofeo della Mole")
 
+    # Cambiare regolamento non tocca i piazzamenti salvati: si ricalcolano classifica e storico
+    if st.session_state.is_admin:
+        names = list(PRESETS)
+        current = next((n for n in names if ruleset_key(PRESETS[n]) == rules.key), None)
+        choice = st.selectbox("⚖️ Regolamento in vigore", names,
+                              index=names.index(current) if current else None,
+                              placeholder="Personalizzato")
+        if choice is not None and choice != current:
+            set_ruleset(data, PRESETS[choice])
+            save_data(data)
+            st.toast(f"Regolamento: {choice}. Classifica ricalcolata.", icon="⚖️")
+            st.rerun()
+
     st.markdown("---")
     st.subheader("1. Struttura del Campionato")
     st.markdown("""
@@ -499,31 +1087,32 @@ with tab6:
         st.markdown("- Cilindrata: **150cc**\n- Oggetti: **Estremi**\n- CPU: **Nessuna**\n- Piste: **Casuali**")
     with c2:
         st.markdown("**Punteggi Gara:**")
-        st.markdown(
-            "| Pos | Punti |\n|---|---|\n| 🥇 1° | **4** |\n| 🥈 2° | **3** |\n| 🥉 3° | **2** |\n| 💩 4° | **1** |")
+        medals = ["🥇 1°", "🥈 2°", "🥉 3°", "💩 4°"]
+        st.markdown("| Pos | Punti |\n|---|---|\n" + "\n".join(
+            f"| {medal} | **{pts}** |" for medal, pts in zip(medals, rules.race_table[1:])))
 
     st.markdown("#### 🌟 Grand Slam (Perfect Score)")
     st.warning(
-        "Se un giocatore vince **tutte e 12 le gare** (fa sempre 1°) nella stessa giornata, ottiene un **Bonus di +10 Punti**!")
+        f"Se un giocatore vince **tutte e 12 le gare** (fa sempre 1°) nella stessa giornata, ottiene un **Bonus di +{rules.grand_slam_bonus} Punti**!")
 
     st.markdown("#### 🖐️ Cinque Vittorie")
     st.success(
-        "Se un giocatore vince **almeno 5 gare** nella stessa giornata, ottiene un **Bonus di +5 Punti**!")
+        f"Se un giocatore vince **almeno {rules.five_wins_min} gare** nella stessa giornata, ottiene un **Bonus di +{rules.five_wins_bonus} Punti**!")
 
     st.subheader("3. 🏀🎯 La Resa dei Conti - Skill Challenge")
-    st.markdown("""
+    st.markdown(f"""
         Al termine delle gare, si svolgono le prove fisiche.
-        Non si sommano i punti fatti, ma si stila una **Classifica** (12-9-6-3 punti).
+        Non si sommano i punti fatti, ma si stila una **Classifica** ({"-".join(map(str, rules.skill_table[1:]))} punti).
         
         ### 🏀 Basket (5 Tiri Speciali)
         * Ogni giocatore ha **5 tiri speciali**.
-        * **Bonus (+5 pt Classifica):** Se realizzi **>= 20 punti** reali.
+        * **Bonus (+{rules.skill_bonus} pt Classifica):** Se realizzi **>= 20 punti** reali.
         * **Spareggio:** 5 tiri extra.
         
         ### 🎯 Freccette (101 -> 0)
         * Si parte da **101** e si scende a **0 esatto**.
         * **Regola "Fine Round":** Se uno chiude, gli altri finiscono il giro (possibili pareggi).
-        * **Bonus (+5 pt Classifica):** Se chiudi in **<= 3 round**.
+        * **Bonus (+{rules.skill_bonus} pt Classifica):** Se chiudi in **<= 3 round**.
         * **Spareggio:** Partita veloce **51 -> 0**.
         """)
 
@@ -563,4 +1152,11 @@ with tab6:
 
     * Se la gara di oggi è migliore di quella di 4 volte fa (che esce dal conteggio), la tua forma sale.
     * Se è peggiore, la tua forma scende.
-    """)
\ No newline at end of file
+    """)
+
+
+if tab6.open:
+    with tab6:
+        tab_regolamento()
+
+log_profile(profiler.stop())
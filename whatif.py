@@ -0,0 +1,54 @@
+import itertools
+
+import numpy as np
+
+from rules import compile_ruleset
+
+# --- E SE...? REGOLAMENTI ALTERNATIVI ---
+# Ricalcola tutto lo storico con molti regolamenti candidati in un colpo solo (vedi
+# ChampionshipTensor.sweep_totals) e confronta le classifiche con quella del regolamento in vigore.
+# Le classifiche seguono standings.ranking: MEDIA PUNTI e, a parità, Totale Punti.
+RACE_SCALES = {"4-3-2-1": [4, 3, 2, 1], "5-3-2-1": [5, 3, 2, 1], "3-2-1-0": [3, 2, 1, 0],
+               "10-7-4-2": [10, 7, 4, 2]}
+SKILL_SCALES = {"12-9-6-3": [12, 9, 6, 3], "12-8-4-0": [12, 8, 4, 0], "10-6-3-1": [10, 6, 3, 1],
+                "8-6-4-2": [8, 6, 4, 2]}
+MAX_CANDIDATES = 5000
+
+
+def _scale_name(scale):
+    return "-".join(map(str, scale))
+
+
+# Tutte le combinazioni dei valori scelti (prodotto cartesiano), come regolamenti completi
+def candidate_rulesets(race_scales, skill_scales, skill_bonus, grand_slam_bonus, five_wins_bonus, five_wins_min):
+    return [{"race_points": list(race), "skill_points": list(skill), "skill_bonus": sb,
+             "grand_slam_bonus": gs, "five_wins_bonus": fw, "five_wins_min": fm}
+            for race, skill, sb, gs, fw, fm in itertools.product(
+                race_scales, skill_scales, skill_bonus, grand_slam_bonus, five_wins_bonus, five_wins_min)]
+
+
+def describe(ruleset):
+    return (f"Gare {_scale_name(ruleset['race_points'])} | Skill {_scale_name(ruleset['skill_points'])} "
+            f"+{ruleset['skill_bonus']} | 12/12 +{ruleset['grand_slam_bonus']} | "
+            f"{ruleset['five_wins_min']}V +{ruleset['five_wins_bonus']}")
+
+
+# Posizione in classifica (1 = primo) per regolamento e giocatore, a partire dai totali (K x giocatori)
+def rank_positions(totals, presences):
+    media = np.round(np.divide(totals, presences, out=np.zeros(totals.shape), where=presences > 0), 2)
+    # lexsort: l'ultima chiave è la principale; a parità di tutto resta l'ordine dei giocatori
+    order = np.lexsort((-totals, -media), axis=-1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, totals.shape[1] + 1)[None, :].repeat(len(totals), 0), axis=-1)
+    return media, ranks
+
+
+# Confronto di current (regolamento in vigore) con i candidati: la riga 0 è sempre current.
+# Restituisce totali, medie e posizioni (K+1 x giocatori) e quanti giocatori cambiano posizione
+def sweep(tensor, current, candidates):
+    rules_list = [current] + [compile_ruleset(c) for c in candidates]
+    totals = tensor.sweep_totals(rules_list)
+    presences = tensor.present().sum(axis=0)
+    media, ranks = rank_positions(totals, presences)
+    return {"rules": rules_list, "totals": totals, "media": media, "ranks": ranks,
+            "moved": (ranks != ranks[0]).sum(axis=1)}
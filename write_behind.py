@@ -0,0 +1,113 @@
+import atexit
+import threading
+import time
+
+from delta_store import merge_deltas
+
+
+# --- CODA DI SCRITTURA DIFFERITA (WRITE-BEHIND) ---
+# Le modifiche vengono accodate subito (il rerun non aspetta la rete) e un thread in background
+# le scrive sul foglio in un unico batch quando per `window` secondi non ne arrivano di nuove.
+# on_saved(seq): chiamata dopo ogni scrittura riuscita con il numero più alto ricevuto in submit
+# (es. per togliere dal diario locale le modifiche ormai al sicuro, vedi offline.py).
+class WriteBehindQueue:
+    def __init__(self, store, window=2.0, on_saved=None):
+        self.store = store
+        self.window = window
+        self.on_saved = on_saved
+        self._cond = threading.Condition()
+        self._pending = None
+        self._pending_edits = 0
+        self._pending_seq = None
+        self._inflight = None
+        self._last_submit = 0.0
+        self.last_error = None
+        self.stats = {"edits": 0, "flushes": 0, "coalesced": 0, "last_flush_ms": 0.0, "total_flush_ms": 0.0}
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    # Restituisce False se non c'era nulla da scrivere. author: chi ha fatto la modifica (registro eventi)
+    def submit(self, data, dirty=None, seq=None, author=None):
+        with self._cond:
+            pending = [d for d in (self._inflight, self._pending) if d is not None]
+            delta = self.store.changes(data, dirty, pending, author)
+            if not delta["cells"] and delta["meta"] is None and delta["rows"] is None:
+                return False
+            self._pending = delta if self._pending is None else merge_deltas(self._pending, delta)
+            self._pending_edits += 1
+            if seq is not None:
+                self._pending_seq = max(seq, self._pending_seq or 0)
+            self.stats["edits"] += 1
+            self._last_submit = time.monotonic()
+            self._cond.notify()
+            return True
+
+    def status(self):
+        with self._cond:
+            if self._pending is not None or self._inflight is not None:
+                return "pending"
+            return "error" if self.last_error else "saved"
+
+    def pending_edits(self):
+        with self._cond:
+            return self._pending_edits
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                wait = self._last_submit + self.window - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+            self.flush()
+
+    # Scrive subito tutto ciò che è in coda (usato anche al logout e all'uscita del processo)
+    def flush(self):
+        with self._cond:
+            if self._pending is None or self._inflight is not None:
+                return
+            delta, edits, seq = self._pending, self._pending_edits, self._pending_seq
+            self._inflight, self._pending, self._pending_edits, self._pending_seq = delta, None, 0, None
+
+        start = time.perf_counter()
+        try:
+            self.store.write(delta)
+        except Exception as e:
+            with self._cond:
+                # Si rimette in coda, senza perdere le modifiche arrivate nel frattempo
+                self._pending = delta if self._pending is None else merge_deltas(delta, self._pending)
+                self._pending_edits += edits
+                if seq is not None:
+                    self._pending_seq = max(seq, self._pending_seq or 0)
+                self._inflight = None
+                self._last_submit = time.monotonic()
+                self.last_error = str(e)
+            return
+
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._cond:
+            self._inflight = None
+            self.last_error = None
+            self.stats["flushes"] += 1
+            self.stats["coalesced"] += edits - 1
+            self.stats["last_flush_ms"] = round(elapsed, 1)
+            self.stats["total_flush_ms"] += elapsed
+            self._cond.notify_all()
+        if seq is not None and self.on_saved is not None:
+            self.on_saved(seq)
+
+    # Attende che la coda sia vuota (es. prima di ricaricare i dati dal foglio)
+    def drain(self, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self.flush()
+            with self._cond:
+                if self._pending is None and self._inflight is None:
+                    return True
+                if self.last_error:
+                    return False
+                self._cond.wait(0.1)
+        return False